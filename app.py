@@ -1,13 +1,18 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, g
 from functools import wraps
-import json
 import os
 import secrets
 import hashlib
+import time
 from datetime import datetime
-from check_free_games import run_process as run_scraper, force_send_notifications, load_settings
+from check_free_games import run_process as run_scraper, force_send_notifications, get_settings, start_outbox_drainer
 from dotenv import load_dotenv
-from database import init_database, get_db
+from database import init_database, get_db, GamesHistoryWriter
+from metrics import REGISTRY as METRICS, PROMETHEUS_CONTENT_TYPE
+from price_history import get_price_history
+from run_coordinator import EPOCH, RunCoordinator
+from scheduler import Scheduler
+from sse import RUN_UNAVAILABLE, STREAM_HEADERS, format_event, parse_event_id, run_event_stream
 
 load_dotenv()
 
@@ -25,6 +30,9 @@ DB_MODE = os.getenv('DB_MODE', 'json')  # json, mongodb, hybrid
 MONGODB_URL = os.getenv('MONGODB_URL', '')
 init_database(mode=DB_MODE, mongodb_url=MONGODB_URL)
 
+# One scraper run at a time; extra /api/stream_run clients attach to it
+RUNS = RunCoordinator()
+
 # Helper Functions
 def get_user_fingerprint():
     """Create unique fingerprint from IP + User-Agent"""
@@ -49,6 +57,25 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    """Per-route latency histogram; streamed responses are timed up to the first byte"""
+    started = g.pop('request_started', None)
+    if started is not None:
+        METRICS.observe(
+            'notifier_http_request_seconds',
+            time.perf_counter() - started,
+            "Flask request latency by route",
+            route=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code,
+        )
+    return response
+
 # Routes
 @app.route('/')
 def index():
@@ -196,7 +223,6 @@ def admin_settings():
         
         db = get_db()
         db.write_settings(data)
-        load_settings()
         return jsonify({'message': 'Settings saved successfully'})
 
 @app.route('/api/db_stats')
@@ -206,6 +232,12 @@ def db_stats():
     db = get_db()
     return jsonify(db.get_stats())
 
+@app.route('/api/metrics')
+@login_required
+def metrics_endpoint():
+    """Run phase timings, counters and request latencies in Prometheus text format"""
+    return app.response_class(METRICS.render_prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/api/games_history')
 def get_games_history():
     """Get games history"""
@@ -213,44 +245,91 @@ def get_games_history():
     history = db.read_games_history()
     return jsonify(history)
 
+@app.route('/api/price_history')
+def get_price_history_summary():
+    """Lowest, highest and last price of every tracked product (?country=IN to filter)"""
+    country = request.args.get('country', '').strip().upper() or None
+    return jsonify(get_price_history().products(country))
+
+@app.route('/api/price_history/<slug>')
+def get_product_price_history(slug):
+    """Price points of one product per region (?country=IN, ?since=<epoch> to narrow)"""
+    country = request.args.get('country', '').strip().upper() or None
+    try:
+        since = float(request.args['since']) if request.args.get('since') else None
+    except ValueError:
+        return jsonify({'error': 'since must be an epoch timestamp'}), 400
+    history = get_price_history().history(slug, country, since)
+    if not history:
+        return jsonify({'error': 'No price history for this product'}), 404
+    return jsonify(history)
+
+def history_recorder():
+    """
+    on_event hook for one run: games it finds are added to the games history
+    in batches (once per run, not per listener), with the rest flushed when it completes
+    """
+    writer = GamesHistoryWriter(get_db())
+    def record(event):
+        if event.get('type') == 'found' and event.get('game'):
+            writer.add(event['game'])
+        elif event.get('type') == 'complete':
+            writer.flush()
+    return record
+
+def open_run_stream(force, profile, resume):
+    """
+    Resolve a /api/stream_run request to (run, last_seen, prelude events): start or
+    attach to a run, or, for a reconnect (resume = parsed Last-Event-ID), find the
+    run it was following. run is None when that run is no longer known, including
+    every run of an earlier process (ids carry the process EPOCH).
+    """
+    if resume:
+        # Never start a new run on reconnect, only catch up with the old one
+        epoch, run_id, last_seen = resume
+        run = RUNS.get(run_id) if epoch == EPOCH else None
+        if run is None:
+            return None, 0, list(RUN_UNAVAILABLE)
+        return run, last_seen, []
+
+    # Choose which function to run based on force parameter
+    if force:
+        kind, target_func = 'force', force_send_notifications
+    else:
+        kind, target_func = 'process', run_scraper
+
+    # One snapshot for the whole run, even if settings are saved meanwhile
+    run, attached = RUNS.submit(kind, target_func, {'profile': profile, 'settings': get_settings()},
+                                on_event=history_recorder())
+    prelude = []
+    if attached:
+        prelude.append({'type': 'log', 'level': 'info',
+                        'message': f"Attached to the {run.state} {kind} run already in progress."})
+    return run, 0, prelude
+
+def stream_run_options(args, is_admin):
+    """(force, profile) from the /api/stream_run query string"""
+    force = args.get('force', 'false').lower() == 'true'
+    # ?profile=true profiles this run (admins only); otherwise NOTIFIER_PROFILE decides
+    profile = True if is_admin and args.get('profile', 'false').lower() == 'true' else None
+    return force, profile
+
 @app.route('/api/stream_run')
 def stream_run():
-    """Stream scraper results"""
-    force = request.args.get('force', 'false').lower() == 'true'
+    """
+    Stream scraper results, attaching to the run already in progress if there is one.
+    A reconnecting EventSource sends Last-Event-ID and only receives the events it missed.
+    """
+    force, profile = stream_run_options(request.args, session.get('is_admin'))
+    resume = parse_event_id(request.headers.get('Last-Event-ID'))
     def generate():
-        load_settings()
-        db = get_db()
-        
-        import queue
-        import threading
-        q = queue.Queue()
-        
-        def callback(data):
-            q.put(data)
-            if data.get('type') == 'found':
-                game = data.get('game')
-                if game:
-                    db.add_game_to_history(game)
-        
-        # Choose which function to run based on force parameter
-        if force:
-            target_func = force_send_notifications
-        else:
-            target_func = run_scraper
-            
-        t = threading.Thread(target=target_func, kwargs={'callback': callback})
-        t.start()
-        
-        while t.is_alive() or not q.empty():
-            try:
-                data = q.get(timeout=0.1)
-                yield f"data: {json.dumps(data)}\n\n"
-            except queue.Empty:
-                continue
-        
-        yield f"data: {json.dumps({'type': 'complete'})}\n\n"
+        run, last_seen, prelude = open_run_stream(force, profile, resume)
+        for event in prelude:
+            yield format_event(event)
+        if run is not None:
+            yield from run_event_stream(run, last_seen)
     
-    return app.response_class(generate(), mimetype='text/event-stream')
+    return app.response_class(generate(), mimetype='text/event-stream', headers=STREAM_HEADERS)
 
 @app.route('/public')
 def public_view():
@@ -282,5 +361,18 @@ def update_env_file(key, value):
         if not found:
             f.write(f'{key}={value}\n')
 
+def start_scheduler():
+    """Run the scheduler in this process if SCHEDULER_ENABLED=true"""
+    if os.getenv('SCHEDULER_ENABLED', 'false').lower() != 'true':
+        return None
+    # Scheduled runs go through the coordinator too, so they never overlap a dashboard run
+    return Scheduler(run=lambda callback, settings: RUNS.run(
+        'process', run_scraper, {'settings': settings}, callback=callback, on_event=history_recorder(),
+    )).start()
+
 if __name__ == '__main__':
+    # Under the debug reloader only the child process that serves requests starts the scheduler
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_outbox_drainer()
+        start_scheduler()
     app.run(debug=True, port=5000)
@@ -0,0 +1,136 @@
+"""
+Optional ASGI entry point: run streams and the games history are served as
+coroutines, every other route by the Flask app
+
+    pip install asgiref uvicorn
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+
+Run a single worker process: runs are coordinated in memory, so every
+client has to reach the same process to attach to or resume a run. An idle
+/api/stream_run connection costs no thread, so one process holds hundreds.
+"""
+import asyncio
+import json
+import time
+from http.cookies import SimpleCookie
+from typing import Dict
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+
+from app import app as flask_app, open_run_stream, start_outbox_drainer, start_scheduler, stream_run_options
+from database import get_db
+from metrics import REGISTRY as METRICS
+from sse import STREAM_HEADERS, async_run_event_stream, format_event, parse_event_id
+
+# ASGI support (optional)
+try:
+    from asgiref.wsgi import WsgiToAsgi
+    ASGI_AVAILABLE = True
+except ImportError:
+    ASGI_AVAILABLE = False
+
+
+def _headers(scope) -> Dict[str, str]:
+    return {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+
+
+def _session(headers: Dict[str, str]):
+    """The Flask session of the request, decoded from its signed cookie"""
+    cookie = SimpleCookie(headers.get('cookie', '')).get(flask_app.config['SESSION_COOKIE_NAME'])
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    if cookie is None or serializer is None:
+        return {}
+    try:
+        return serializer.loads(cookie.value, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return {}
+
+
+async def _until_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+def _observe(route: str, started: float, status: int):
+    METRICS.observe('notifier_http_request_seconds', time.perf_counter() - started,
+                    "Flask request latency by route", route=route, method='GET', status=status)
+
+
+async def stream_run(scope, receive, send):
+    """/api/stream_run without tying up a thread while the stream is idle"""
+    started = time.perf_counter()
+    headers = _headers(scope)
+    args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+    force, profile = stream_run_options(args, _session(headers).get('is_admin'))
+    resume = parse_event_id(headers.get('last-event-id'))
+    # Starting a run stats settings.json and spawns a thread, so keep it off the event loop
+    run, last_seen, prelude = await asyncio.to_thread(open_run_stream, force, profile, resume)
+
+    response_headers = [(b'content-type', b'text/event-stream; charset=utf-8')]
+    response_headers += [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in STREAM_HEADERS.items()]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': response_headers})
+    _observe('/api/stream_run', started, 200)
+
+    async def body():
+        for event in prelude:
+            await send({'type': 'http.response.body', 'body': format_event(event).encode('utf-8'), 'more_body': True})
+        if run is not None:
+            async for message in async_run_event_stream(run, last_seen):
+                await send({'type': 'http.response.body', 'body': message.encode('utf-8'), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    # Stop streaming as soon as the client goes away; the run itself carries on
+    streaming = asyncio.ensure_future(body())
+    disconnected = asyncio.ensure_future(_until_disconnect(receive))
+    _, pending = await asyncio.wait({streaming, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+
+
+async def games_history(scope, receive, send):
+    """/api/games_history with the database read off the event loop"""
+    started = time.perf_counter()
+    history = await asyncio.to_thread(get_db().read_games_history)
+    body = json.dumps(history).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('latin-1')),
+    ]})
+    await send({'type': 'http.response.body', 'body': body})
+    _observe('/api/games_history', started, 200)
+
+
+ROUTES = {
+    '/api/stream_run': stream_run,
+    '/api/games_history': games_history,
+}
+
+
+class AsyncApp:
+    """ASGI application serving ROUTES natively and the rest of the Flask app through a thread pool"""
+
+    def __init__(self, wsgi_app):
+        if not ASGI_AVAILABLE:
+            raise RuntimeError("The async serving mode needs asgiref: pip install asgiref uvicorn")
+        self.wsgi = WsgiToAsgi(wsgi_app)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    start_outbox_drainer()
+                    start_scheduler()
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        route = ROUTES.get(scope.get('path'))
+        if scope['type'] == 'http' and scope.get('method') == 'GET' and route is not None:
+            await route(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+
+application = AsyncApp(flask_app)
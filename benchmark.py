@@ -0,0 +1,451 @@
+"""
+Offline replay benchmark for the notifier pipeline
+
+Serves Epic API fixtures from a local HTTP stand-in and accepts mail on a
+local SMTP sink, so run_process and fetch_cheap_games can be timed on a box
+with no network access. Reports per-stage wall time, request counts and
+peak Python memory for each scenario.
+
+    python benchmark.py                                   # synthetic fixtures
+    python benchmark.py --free-games 40 --catalog 5000 --latency 0.05 --recipients 200
+    python benchmark.py --fixtures fixtures/              # recorded responses
+    python benchmark.py --record fixtures/                # capture live responses (needs network)
+
+A fixtures directory holds freeGamesPromotions.json (the raw API response)
+and catalog.json (a store GraphQL response or a plain list of elements).
+"""
+import argparse
+import datetime
+import functools
+import json
+import logging
+import os
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, urlunsplit
+
+from requests.adapters import HTTPAdapter
+
+from game import DATE_FORMAT
+
+# Functions of check_free_games timed as pipeline stages
+TIMED_STAGES = [
+    'fetch_free_games', 'fetch_region_free_games', 'manage_notification_history',
+    'compact_notification_history', 'compact_price_history', 'drain_outbox', 'build_email_message',
+]
+
+FREE_GAMES_FIXTURE = 'freeGamesPromotions.json'
+CATALOG_FIXTURE = 'catalog.json'
+
+
+# Fixtures
+
+def make_free_games_payload(count, price_threshold=10000):
+    """freeGamesPromotions response with count promotions, alternating free and cheap"""
+    # Offers run from now into next week, so they stay inside the notification retention window
+    now = datetime.datetime.now(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+    elements = []
+    for i in range(count):
+        price = 0 if i % 2 == 0 else price_threshold // 2
+        elements.append({
+            'title': f"Promo Game {i}",
+            'description': f"Synthetic promotion {i}",
+            'keyImages': [{'type': 'Thumbnail', 'url': f"https://cdn.example/promo-{i}.jpg"}],
+            'catalogNs': {'mappings': [{'pageSlug': f"promo-game-{i}"}]},
+            'price': {'totalPrice': {
+                'discountPrice': price,
+                'originalPrice': price_threshold * 2,
+                'fmtPrice': {'originalPrice': f"{price_threshold * 2 / 100:.2f}", 'discountPrice': f"{price / 100:.2f}"},
+            }},
+            'promotions': {'promotionalOffers': [{'promotionalOffers': [{
+                'startDate': now.strftime(DATE_FORMAT),
+                'endDate': (now + datetime.timedelta(days=7 + i % 7)).strftime(DATE_FORMAT),
+            }]}]},
+        })
+    return {'data': {'Catalog': {'searchStore': {'elements': elements}}}}
+
+
+def make_catalog(count, price_threshold=10000):
+    """Store catalog elements sorted by price; about half fall under the threshold"""
+    elements = []
+    for i in range(count):
+        price = i * 2 * price_threshold // max(1, count)
+        # Every seventh item is an add-on so the keyword filter has work to do
+        title = f"Catalog Game {i}" + (" DLC" if i % 7 == 0 else "")
+        elements.append({
+            'title': title,
+            'description': f"Synthetic catalog item {i}",
+            'urlSlug': f"catalog-game-{i}",
+            'status': 'ACTIVE',
+            'categories': [{'path': 'games'}, {'path': 'games/edition/base'}],
+            'keyImages': [{'type': 'Thumbnail', 'url': f"https://cdn.example/catalog-{i}.jpg"}],
+            'price': {'totalPrice': {
+                'discountPrice': price,
+                'originalPrice': price_threshold * 3,
+                'fmtPrice': {'originalPrice': f"{price_threshold * 3 / 100:.2f}", 'discountPrice': f"{price / 100:.2f}"},
+            }},
+        })
+    return elements
+
+
+def load_fixtures(directory):
+    """(freeGamesPromotions payload, catalog elements) recorded in a directory"""
+    with open(os.path.join(directory, FREE_GAMES_FIXTURE), 'r') as f:
+        free_games = json.load(f)
+    with open(os.path.join(directory, CATALOG_FIXTURE), 'r') as f:
+        catalog = json.load(f)
+    if isinstance(catalog, dict):
+        catalog = catalog['data']['Catalog']['searchStore']['elements']
+    return free_games, catalog
+
+
+def record_fixtures(directory, country='IN', catalog_items=1000):
+    """Capture live freeGamesPromotions and catalog responses into a fixtures directory"""
+    import http_session
+    from check_free_games import FREE_GAMES_URL, iter_catalog_pages
+    from epicstore_api import EpicGamesStoreAPI
+
+    os.makedirs(directory, exist_ok=True)
+    response = http_session.get(FREE_GAMES_URL.format(country=country))
+    response.raise_for_status()
+    with open(os.path.join(directory, FREE_GAMES_FIXTURE), 'w') as f:
+        json.dump(response.json(), f)
+
+    api = EpicGamesStoreAPI(locale='en-US', country=country, session=http_session.get_store_session())
+    catalog = []
+    for elements, _ in iter_catalog_pages(api, float('inf'), max_items=catalog_items, country=country):
+        catalog.extend(elements)
+    with open(os.path.join(directory, CATALOG_FIXTURE), 'w') as f:
+        json.dump(catalog, f)
+    print(f"Recorded {len(catalog)} catalog items into {directory}")
+
+
+# Local stand-ins
+
+class FixtureServer:
+    """HTTP stand-in for the promotions feed, the store GraphQL endpoint and store pages"""
+
+    def __init__(self, free_games_payload, catalog, latency=0.0):
+        self.free_games_body = json.dumps(free_games_payload).encode('utf-8')
+        self.etag = '"fixture-%x"' % (hash(self.free_games_body) & 0xffffffff)
+        self.catalog = sorted(
+            catalog, key=lambda game: ((game.get('price') or {}).get('totalPrice') or {}).get('discountPrice') or 0
+        )
+        self.latency = latency
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, so connection pooling is measured too
+
+            def log_message(self, *args):
+                pass
+
+            def _count(self, route):
+                with server._lock:
+                    server.requests[route] += 1
+                if server.latency:
+                    time.sleep(server.latency)
+
+            def _send(self, status, body=b'', headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                if not self.path.startswith('/freeGamesPromotions'):
+                    self._count('other')
+                    return self._send(404)
+                if self.headers.get('If-None-Match') == server.etag:
+                    self._count('free_games_304')
+                    return self._send(304, headers={'ETag': server.etag})
+                self._count('free_games')
+                self._send(200, server.free_games_body, {'Content-Type': 'application/json', 'ETag': server.etag})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                query = json.loads(self.rfile.read(length) or b'{}')
+                if self.path != '/graphql':
+                    self._count('other')
+                    return self._send(404)
+                self._count('catalog')
+                variables = query.get('variables') or {}
+                start = int(variables.get('start') or 0)
+                count = int(variables.get('count') or 30)
+                body = json.dumps({'data': {'Catalog': {'searchStore': {
+                    'elements': server.catalog[start:start + count],
+                    'paging': {'count': count, 'total': len(server.catalog)},
+                }}}}).encode('utf-8')
+                self._send(200, body, {'Content-Type': 'application/json'})
+
+            def do_HEAD(self):
+                self._count('store_page')
+                self._send(200)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.netloc = f"127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def request_counts(self):
+        with self._lock:
+            return dict(self.requests)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class SmtpSink:
+    """Minimal SMTP server that accepts every message and counts deliveries"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.messages = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        sink = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def reply(self, line):
+                self.wfile.write((line + "\r\n").encode('ascii'))
+
+            def handle(self):
+                with sink._lock:
+                    sink.connections += 1
+                self.reply("220 benchmark sink")
+                while True:
+                    line = self.rfile.readline()
+                    if not line:
+                        return
+                    command = line.decode('utf-8', 'replace').strip().upper()
+                    if command.startswith(('EHLO', 'HELO')):
+                        self.reply("250-benchmark\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+                    elif command.startswith('AUTH'):
+                        self.reply("235 accepted")
+                    elif command == 'DATA':
+                        self.reply("354 go ahead")
+                        while self.rfile.readline() not in (b".\r\n", b""):
+                            pass
+                        if sink.latency:
+                            time.sleep(sink.latency)
+                        with sink._lock:
+                            sink.messages += 1
+                        self.reply("250 queued")
+                    elif command == 'QUIT':
+                        self.reply("221 bye")
+                        return
+                    else:
+                        self.reply("250 ok")
+
+        self.server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LocalRouteAdapter(HTTPAdapter):
+    """Transport adapter that sends every request to the fixture server, keeping path and query"""
+
+    def __init__(self, netloc, **kwargs):
+        self.netloc = netloc
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.url = urlunsplit(('http', self.netloc, parts.path, parts.query, ''))
+        return super().send(request, **kwargs)
+
+
+def route_sessions(http_session, netloc):
+    """Point the shared scraper sessions at the fixture server"""
+    for session in (http_session.get_session(), http_session.get_store_session()):
+        adapter = LocalRouteAdapter(netloc, pool_connections=http_session.POOL_SIZE, pool_maxsize=http_session.POOL_SIZE)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+
+# Measurement
+
+class StageTimer:
+    """Wraps module functions to accumulate call counts and wall time per function"""
+
+    def __init__(self, module, names):
+        self.module = module
+        self.calls = Counter()
+        self.seconds = Counter()
+        self._lock = threading.Lock()
+        for name in names:
+            setattr(module, name, self._wrap(name, getattr(module, name)))
+
+    def _wrap(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.calls[name] += 1
+                    self.seconds[name] += time.perf_counter() - start
+        return timed
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.seconds.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {name: {'calls': self.calls[name], 'seconds': round(self.seconds[name], 4)} for name in self.calls}
+
+
+def run_scenario(name, func, server, sink, timer, http_session):
+    """Run one scenario and collect wall time, stage timings, request counts and peak memory"""
+    events = []
+    requests_before = Counter(server.request_counts())
+    pool_before = http_session.connection_stats()
+    messages_before = sink.messages
+    timer.reset()
+
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    func(events.append)
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+
+    pool_after = http_session.connection_stats()
+    requests_delta = Counter(server.request_counts())
+    requests_delta.subtract(requests_before)
+    return {
+        'scenario': name,
+        'wall_seconds': round(wall, 4),
+        'peak_memory_kb': round(peak / 1024, 1),
+        'stages': timer.snapshot(),
+        'pipeline': [event['stage'] for event in events if event.get('stage')],
+        'requests': {route: count for route, count in requests_delta.items() if count},
+        'connections_opened': pool_after['connections'] - pool_before['connections'],
+        'emails_delivered': sink.messages - messages_before,
+        'found': sum(1 for event in events if event.get('type') == 'found'),
+        'status': next((event['status'] for event in reversed(events) if event.get('type') == 'status'), None),
+    }
+
+
+def print_report(results):
+    for result in results:
+        print(f"\n== {result['scenario']}: {result['wall_seconds']:.3f}s wall, "
+              f"peak {result['peak_memory_kb']:.0f} KiB, status {result['status']}")
+        print(f"   found {result['found']} game(s), {result['emails_delivered']} email(s) delivered, "
+              f"{result['connections_opened']} HTTP connection(s) opened")
+        requests = ', '.join(f"{route}={count}" for route, count in sorted(result['requests'].items()))
+        print(f"   requests: {requests or 'none'}")
+        for name, stage in sorted(result['stages'].items(), key=lambda item: -item[1]['seconds']):
+            print(f"   {name:<30} {stage['seconds']:>8.3f}s  x{stage['calls']}")
+        for stage in result['pipeline']:
+            print(f"   pipeline {stage['stage']:<21} {stage['seconds']:>8.3f}s  {stage['items_in']} in / {stage['items_out']} out")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark of the notifier pipeline")
+    parser.add_argument('--fixtures', help="Directory with freeGamesPromotions.json and catalog.json")
+    parser.add_argument('--record', metavar='DIR', help="Capture live fixtures into DIR and exit (needs network)")
+    parser.add_argument('--free-games', type=int, default=20, help="Synthetic promotions to serve")
+    parser.add_argument('--catalog', type=int, default=2000, help="Synthetic catalog items to serve")
+    parser.add_argument('--countries', default='IN', help="Comma separated store regions")
+    parser.add_argument('--recipients', type=int, default=25, help="Notification recipients")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every HTTP response")
+    parser.add_argument('--smtp-latency', type=float, default=0.0, help="Seconds added to every accepted email")
+    parser.add_argument('--json', metavar='FILE', help="Also write the results as JSON")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+
+    if args.record:
+        record_fixtures(args.record, country=args.countries.split(',')[0], catalog_items=args.catalog)
+        return 0
+
+    price_threshold = 10000
+    if args.fixtures:
+        free_games_payload, catalog = load_fixtures(args.fixtures)
+    else:
+        free_games_payload = make_free_games_payload(args.free_games, price_threshold)
+        catalog = make_catalog(args.catalog, price_threshold)
+
+    server = FixtureServer(free_games_payload, catalog, latency=args.latency)
+    sink = SmtpSink(latency=args.smtp_latency)
+
+    # Run in a scratch directory so caches, history and the outbox start cold
+    # and nothing in the working tree is touched
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, repo_dir)
+    workdir = tempfile.mkdtemp(prefix='notifier-bench-')
+    os.chdir(workdir)
+    with open('settings.json', 'w') as f:
+        json.dump({
+            'price_threshold': price_threshold // 100,
+            'emails': [f"user{i}@bench.invalid" for i in range(args.recipients)],
+            'countries': [c.strip().upper() for c in args.countries.split(',') if c.strip()],
+            'catalog_max_items': max(len(catalog), 1),
+        }, f)
+    os.environ.update({
+        'SMTP_SERVER': '127.0.0.1', 'SMTP_PORT': str(sink.port), 'SMTP_STARTTLS': 'false',
+        'EMAIL': 'bench@bench.invalid', 'PASSWORD': 'bench', 'TO_EMAIL': 'bench@bench.invalid',
+        'FROM_EMAIL': 'bench@bench.invalid',
+    })
+
+    tracemalloc.start()
+    import check_free_games
+    import http_session
+
+    route_sessions(http_session, server.netloc)
+    timer = StageTimer(check_free_games, TIMED_STAGES)
+
+    def warm_run(callback):
+        # Past the cache TTL, so the promotions feed is revalidated with a conditional GET
+        settings = check_free_games.get_settings()._replace(free_games_cache_ttl=0)
+        check_free_games.run_process(callback, settings=settings)
+
+    scenarios = [
+        ('run_process (cold)', check_free_games.run_process),
+        ('drain_outbox', lambda callback: check_free_games.drain_outbox(emit=callback)),
+        ('run_process (warm)', warm_run),
+        ('fetch_cheap_games (cold)', check_free_games.fetch_cheap_games),
+        ('fetch_cheap_games (warm url cache, full scan)',
+         lambda callback: check_free_games.fetch_cheap_games(callback, full_scan=True)),
+        ('fetch_cheap_games (incremental)', check_free_games.fetch_cheap_games),
+    ]
+    try:
+        results = [run_scenario(name, func, server, sink, timer, http_session) for name, func in scenarios]
+    finally:
+        tracemalloc.stop()
+        server.close()
+        sink.close()
+
+    print(f"Fixtures: {len(free_games_payload['data']['Catalog']['searchStore']['elements'])} promotions, "
+          f"{len(catalog)} catalog items, {args.latency * 1000:.0f} ms latency; work dir {workdir}")
+    print_report(results)
+    if args.json:
+        with open(os.path.join(repo_dir, args.json) if not os.path.isabs(args.json) else args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Snapshot of the last catalog scan, so repeat deep searches only process changed offers
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Fields whose change can alter whether or how an offer is notified
+HASHED_FIELDS = ('title', 'status', 'urlSlug', 'productSlug', 'price', 'promotions', 'categories')
+
+
+def content_hash(game: Dict) -> str:
+    """Short stable hash of the notification-relevant fields of a catalog element"""
+    relevant = {field: game.get(field) for field in HASHED_FIELDS}
+    encoded = json.dumps(relevant, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=8).hexdigest()
+
+
+def item_key(country: str, game: Dict) -> Optional[str]:
+    """Region-qualified offer id, falling back to the product slug"""
+    offer_id = game.get('id') or game.get('urlSlug') or game.get('productSlug')
+    return f"{country}:{offer_id}" if offer_id else None
+
+
+class CatalogSnapshot:
+    """On-disk map of offer key -> (content hash, last seen) from previous scans"""
+
+    def __init__(self, path='catalog_snapshot.json', max_age=30 * 86400, max_entries=20000):
+        """
+        Args:
+            path: JSON file holding {"fingerprint": str, "items": {key: [hash, seen_at]}}
+            max_age: Seconds after which an offer not seen again is forgotten
+            max_entries: Oldest entries are evicted beyond this size
+        """
+        self.path = path
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.fingerprint = None
+        self.items: Dict[str, list] = {}
+        self.counts = {'new': 0, 'changed': 0, 'unchanged': 0}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Load the previous scan from disk"""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                self.fingerprint = data.get('fingerprint')
+                self.items = data.get('items') or {}
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable catalog snapshot {self.path}: {e}")
+            self.items = {}
+
+    def begin(self, fingerprint: str):
+        """
+        Start a scan. fingerprint identifies the settings the snapshot was built
+        under; if they differ every offer has to be evaluated again.
+        """
+        with self._lock:
+            if fingerprint != self.fingerprint:
+                if self.items:
+                    logging.info("Filter settings changed since the last catalog scan, running a full sync")
+                self.items = {}
+                self.fingerprint = fingerprint
+            self.counts = {'new': 0, 'changed': 0, 'unchanged': 0}
+
+    def changed(self, country: str, game: Dict, now: Optional[float] = None) -> bool:
+        """Record the offer as seen and return True if it is new or differs from the last scan"""
+        key = item_key(country, game)
+        if key is None:
+            return True
+        digest = content_hash(game)
+        now = now if now is not None else time.time()
+        with self._lock:
+            previous = self.items.get(key)
+            self.items[key] = [digest, now]
+            if previous is None:
+                self.counts['new'] += 1
+                return True
+            if previous[0] != digest:
+                self.counts['changed'] += 1
+                return True
+            self.counts['unchanged'] += 1
+            return False
+
+    def forget(self, country: str, game: Dict):
+        """Drop an offer so the next scan evaluates it again (e.g. left unchecked this time)"""
+        key = item_key(country, game)
+        with self._lock:
+            self.items.pop(key, None)
+
+    def _evict(self, now: float):
+        cutoff = now - self.max_age
+        self.items = {key: entry for key, entry in self.items.items() if entry[1] >= cutoff}
+        overflow = len(self.items) - self.max_entries
+        if overflow > 0:
+            oldest = sorted(self.items, key=lambda key: self.items[key][1])
+            for key in oldest[:overflow]:
+                del self.items[key]
+
+    def save(self):
+        """Write the snapshot atomically"""
+        with self._lock:
+            self._evict(time.time())
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump({'fingerprint': self.fingerprint, 'items': self.items}, f)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logging.error(f"Failed to save catalog snapshot: {e}")
@@ -1,98 +1,214 @@
-import datetime
 import logging
 import os
-import smtplib
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import json
-from pathlib import Path
+from collections import namedtuple
 
 import requests
 from dotenv import load_dotenv
 from epicstore_api import EpicGamesStoreAPI
 
+import http_session
+from catalog_snapshot import CatalogSnapshot, item_key
+from game import Game
+from mailer import SmtpDeliveryEngine
+from metrics import REGISTRY as METRICS
+from notification_store import get_notification_history
+from outbox import Outbox
+from pipeline import PipelineStage, filter_stage, map_stage, run_pipeline
+from price_history import element_slug, get_price_history
+from profiling import profile_run
+from settings import SETTINGS_FILE, get_settings_store
+from url_cache import UrlValidationCache, VALID_STATUSES
+
 # Load environment variables from .env file
 load_dotenv()
 
 # Global Configuration
-SETTINGS_FILE = 'settings.json'
-PRICE_THRESHOLD = 10000 # Default
-CURRENCY_CODE = "INR"
-EMAILS = []
-CATEGORIES = []
-DEEP_SEARCH_FREE = False
+# Everything tunable lives in settings.json and is read through get_settings() snapshots
+URL_CACHE_FILE = 'url_validation_cache.json'
+CATALOG_SNAPSHOT_FILE = 'catalog_snapshot.json'
+OUTBOX_FILE = 'outbox.jsonl'
+OUTBOX_POLL_INTERVAL = 60  # Longest wait of the background drainer between outbox checks
+FREE_GAMES_URL = "https://store-site-backend-static.ak.epicgames.com/freeGamesPromotions?locale=en-US&country={country}&allowCountries={country}"
+FREE_GAMES_CACHE_FILE = 'free_games_cache_{country}.json'
+
+_applied_http_settings = None
+_outbox_queued = threading.Event()  # Set when a run queues mail, so this process's drainer sends it at once
+_outbox_drainer = None
+
+
+def get_settings():
+    """
+    Current immutable settings snapshot. The file is only re-read after it
+    changes on disk or is rewritten through the settings store.
+    """
+    global _applied_http_settings
+    settings = get_settings_store(SETTINGS_FILE).get()
+    # The HTTP pool is process-wide, so it follows the newest snapshot
+    if settings.http is not _applied_http_settings:
+        http_session.configure(**settings.http)
+        _applied_http_settings = settings.http
+    return settings
+
 
 def load_settings():
-    """Load configuration from settings.json"""
-    global PRICE_THRESHOLD, CURRENCY_CODE, EMAILS, CATEGORIES, DEEP_SEARCH_FREE
+    """Re-read settings.json now and return the fresh snapshot."""
+    get_settings_store(SETTINGS_FILE).invalidate()
+    return get_settings()
+
+def emit_metric(emit, name, value, kind='histogram', help_text=None, **labels):
+    """Record a metric in the process registry and emit it as a {'type': 'metric'} event."""
+    event = {'type': 'metric', 'name': name, 'kind': kind, 'value': value, 'labels': labels}
+    if help_text:
+        event['help'] = help_text
+    METRICS.record(event)
+    if emit:
+        emit(event)
+
+
+@contextmanager
+def phase(emit, name):
+    """Time a run phase into the notifier_phase_seconds histogram."""
+    start = time.perf_counter()
     try:
-        if os.path.exists(SETTINGS_FILE):
-            with open(SETTINGS_FILE, 'r') as f:
-                data = json.load(f)
-                # settings stores price in major units (e.g. 100), we need minor (10000)
-                PRICE_THRESHOLD = int(data.get('price_threshold', 100)) * 100 
-                CURRENCY_CODE = data.get('currency', 'INR')
-                EMAILS = data.get('emails', [])
-                CATEGORIES = data.get('categories', [])
-                DEEP_SEARCH_FREE = data.get('deep_search_free', False)
-                
-                # If deep search is enabled, enforce price = 0
-                if DEEP_SEARCH_FREE:
-                    PRICE_THRESHOLD = 0
-                    
-                logging.info(f"Loaded settings: Threshold={PRICE_THRESHOLD}, Emails={len(EMAILS)}, DeepSearch={DEEP_SEARCH_FREE}")
-    except Exception as e:
-        logging.error(f"Failed to load settings: {e}")
+        yield
+    finally:
+        emit_metric(emit, 'notifier_phase_seconds', round(time.perf_counter() - start, 6),
+                    help_text="Wall time of each scraper run phase", phase=name)
 
-def is_valid_game(game):
+
+def is_valid_game(game, settings=None):
     """Filter out invalid/unwanted game entries."""
-    title = game.get("title", "").lower()
-    
-    # Exclude dev/test audiences
-    if "audience" in title or "dev " in title or " dev" in title:
-        return False
-    
-    # Exclude DLC/add-ons (look for common patterns)
-    dlc_keywords = ["dlc", " pack", "bundle", "skin", "add-on", "expansion"]
-    if any(keyword in title for keyword in dlc_keywords):
-        return False
-    
-    # Must have a valid product slug
-    url_slug = game.get("urlSlug") or game.get("productSlug")
-    if not url_slug or url_slug.strip() == "":
-        return False
-    
-    # Check if game is actually available (not coming soon)
-    status = game.get("status", "")
-    if status == "COMING_SOON":
-        return False
-    
-    # Additional check: title should not be empty or suspiciously short
-    if len(title.strip()) < 3:
-        return False
-    
-    return True
+    return (settings or get_settings()).filters.is_valid_game(game)
 
-def validate_game_url(url, timeout=3):
-    """Verify that a game URL is accessible (not 404)."""
+def get_url_status(url, timeout=None):
+    """Return the HTTP status of a HEAD request to url, or None on network error."""
     try:
-        response = requests.head(url, timeout=timeout, allow_redirects=True)
-        # Accept 200 OK or 301/302 redirects
-        if response.status_code in [200, 301, 302]:
-            return True
-        return False
+        response = http_session.head(url, timeout=timeout, allow_redirects=True)
+        return response.status_code
     except Exception as e:
         logging.debug(f"URL validation failed for {url}: {e}")
-        return False
+        return None
+
+def validate_game_url(url, timeout=None):
+    """Verify that a game URL is accessible (not 404)."""
+    # Accept 200 OK or 301/302 redirects
+    return get_url_status(url, timeout=timeout) in VALID_STATUSES
+
+def get_url_cache(settings=None):
+    """Create a URL validation cache using the given (or current) settings."""
+    settings = settings or get_settings()
+    return UrlValidationCache(
+        URL_CACHE_FILE,
+        ttl_valid=settings.url_cache_ttl_valid,
+        ttl_invalid=settings.url_cache_ttl_invalid,
+        max_entries=settings.url_cache_max_entries,
+    )
+
+def validate_game_urls(candidates, emit_callback=None, max_workers=None, time_budget=None, cache=None):
+    """
+    Validate candidate game URLs concurrently.
+    candidates: iterable of (url, title, item) tuples, consumed lazily. Yields each
+    item as soon as its URL is confirmed. Validation stops once HEAD requests have
+    been in flight for time_budget seconds in total; time spent waiting on a slow
+    source (e.g. catalog paging) does not count. Fresh results in cache are used
+    without touching the network.
+    """
+    def skip(title):
+        if emit_callback:
+            emit_callback({'type': 'log', 'level': 'warning', 'message': f"Skipped invalid URL: {title}"})
+
+    def elapsed():
+        """Seconds of the budget used: only while requests are pending"""
+        return spent + (time.monotonic() - busy_since if busy_since is not None else 0)
+
+    def finish(future):
+        nonlocal spent, busy_since
+        url, title, item = pending.pop(future)
+        if not pending:
+            spent += time.monotonic() - busy_since
+            busy_since = None
+        status = future.result()
+        # Network errors are transient, so only real HTTP answers are cached
+        if cache is not None and status is not None:
+            cache.put(url, status)
+        if status in VALID_STATUSES:
+            return item
+        skip(title)
+        return None
+
+    if max_workers is None or time_budget is None:
+        settings = get_settings()
+        max_workers = max_workers or settings.url_validation_workers
+        time_budget = time_budget if time_budget is not None else settings.url_validation_budget
+    spent = 0.0
+    busy_since = None  # Start of the current stretch with requests in flight
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    completed = queue.Queue()
+    pending = {}
+    unchecked = 0
+    try:
+        for url, title, item in candidates:
+            if cache is not None:
+                cached = cache.get(url)
+                if cached is not None:
+                    if cached:
+                        yield item
+                    else:
+                        skip(title)
+                    continue
+
+            if elapsed() >= time_budget:
+                unchecked += 1
+                continue
+
+            if busy_since is None:
+                busy_since = time.monotonic()
+            future = executor.submit(get_url_status, url)
+            pending[future] = (url, title, item)
+            future.add_done_callback(completed.put)
+
+            # Hand back anything already validated so 'found' events keep flowing
+            while not completed.empty():
+                item = finish(completed.get_nowait())
+                if item is not None:
+                    yield item
+
+        while pending:
+            try:
+                future = completed.get(timeout=max(0, time_budget - elapsed()))
+            except queue.Empty:
+                unchecked += len(pending)
+                break
+            item = finish(future)
+            if item is not None:
+                yield item
+
+        if unchecked:
+            msg = f"URL validation budget of {time_budget}s exceeded, skipped {unchecked} unchecked game(s)"
+            if emit_callback:
+                emit_callback({'type': 'log', 'level': 'warning', 'message': msg})
+            logging.warning(msg)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 # Load initially
-load_settings()
+get_settings()
 
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = os.getenv("SMTP_PORT")
 EMAIL = os.getenv("EMAIL")  # This is your SMTP login email
 PASSWORD = os.getenv("PASSWORD")
-# TO_EMAIL is now handled via EMAILS list from settings.json, but keep env as fallback
+# TO_EMAIL is now handled via the emails list in settings.json, but keep env as fallback
 TO_EMAIL = os.getenv("TO_EMAIL")
 FROM_EMAIL = os.getenv("FROM_EMAIL")
 
@@ -120,29 +236,135 @@ def check_env_variables():
         raise ValueError(f"SMTP_PORT must be a valid number, got: {required_vars['SMTP_PORT']}")
 
 
-def format_date(date_string):
-    """Format the date string to a more readable format."""
+def _load_free_games_cache(country):
+    """Load the cached freeGamesPromotions validators and parsed games for a region, if any."""
+    cache_file = FREE_GAMES_CACHE_FILE.format(country=country)
     try:
-        date_obj = datetime.datetime.strptime(date_string, "%Y-%m-%dT%H:%M:%S.000Z")
-        return date_obj.strftime(
-            "%B %d, %Y at %I:%M %p"
-        )  # Example: January 09, 2025 at 04:00 PM
-    except ValueError:
-        logging.error(f"Error parsing date: {date_string}")
-        return date_string  # Return the original string if parsing fails
+        if os.path.exists(cache_file):
+            with open(cache_file, 'r') as f:
+                cache = json.load(f)
+            cache['games'] = [Game.from_dict(game) for game in cache.get('games') or []]
+            return cache
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable free games cache {cache_file}: {e}")
+    return None
 
+def _save_free_games_cache(country, cache):
+    """Atomically write the freeGamesPromotions cache for a region."""
+    cache_file = FREE_GAMES_CACHE_FILE.format(country=country)
+    try:
+        tmp_path = f"{cache_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(cache, games=[game.to_dict() for game in cache['games']]), f)
+        os.replace(tmp_path, cache_file)
+    except Exception as e:
+        logging.error(f"Failed to save free games cache: {e}")
+
+def _region_prices(game):
+    """Per-region price entry for a game record."""
+    return {
+        "original_price": game.original_price,
+        "discounted_price": game.discounted_price,
+    }
+
+def merge_region_games(results):
+    """
+    Merge per-region game lists into one list deduplicated by product slug.
+    results: list of (country, games) in priority order. The first region's
+    record is kept and every region's prices are collected in its region_prices.
+    """
+    merged = {}
+    for country, games in results:
+        for game in games or []:
+            slug = UrlValidationCache.slug_for(game.url)
+            if slug not in merged:
+                merged[slug] = game.replace(region_prices={})
+            merged[slug].region_prices[country] = _region_prices(game)
+    return list(merged.values())
 
-def fetch_free_games():
-    """Fetch free and discounted games under the threshold from the Epic Games Store."""
-    url = f"https://store-site-backend-static.ak.epicgames.com/freeGamesPromotions?locale=en-US&country=IN&allowCountries=IN"
+def fetch_free_games(settings=None):
+    """Fetch free and discounted games under the threshold from every configured region."""
+    settings = settings or get_settings()
+    countries = list(settings.countries)
+    # Regions are fetched concurrently so the total time is roughly one region's latency
+    with ThreadPoolExecutor(max_workers=len(countries)) as executor:
+        results = list(zip(countries, executor.map(
+            lambda country: fetch_region_free_games(country, settings), countries
+        )))
+
+    get_price_history().flush()
+
+    if all(games is None for _, games in results):
+        return None
+    return merge_region_games(results)
+
+def cached_free_games(settings=None):
+    """Free games from each region's last fetch, read from the caches without any request."""
+    settings = settings or get_settings()
+    return merge_region_games(
+        [(country, (_load_free_games_cache(country) or {}).get('games')) for country in settings.countries]
+    )
+
+def _record_prices(country, elements):
+    """Feed the prices of fetched store elements into the price history (flushed by the caller)."""
     try:
-        response = requests.get(url)
+        get_price_history().record_elements(country, elements or [])
+    except Exception as e:
+        logging.error(f"Error recording prices for {country}: {e}")
+
+def fetch_region_free_games(country, settings=None):
+    """Fetch free and discounted games under the threshold for one store region."""
+    settings = settings or get_settings()
+    # The parsed list depends on the threshold, so a cache built with another one is unusable
+    cache = _load_free_games_cache(country)
+    if cache and cache.get('price_threshold') != settings.price_threshold:
+        cache = None
+
+    now = time.time()
+    if cache and now - cache.get('fetched_at', 0) < settings.free_games_cache_ttl:
+        logging.info(f"Using cached free games for {country} (within TTL).")
+        return cache['games']
+
+    headers = {}
+    if cache:
+        if cache.get('etag'):
+            headers['If-None-Match'] = cache['etag']
+        if cache.get('last_modified'):
+            headers['If-Modified-Since'] = cache['last_modified']
+
+    try:
+        response = http_session.get(FREE_GAMES_URL.format(country=country), headers=headers)
+        if response.status_code == 304 and cache:
+            logging.info(f"Free games for {country} unchanged since last fetch (304).")
+            cache['fetched_at'] = now
+            _save_free_games_cache(country, cache)
+            return cache['games']
         response.raise_for_status()
         data = response.json()
     except requests.RequestException as e:
-        logging.error(f"Error fetching free games: {e}")
+        logging.error(f"Error fetching free games for {country}: {e}")
         return None
 
+    try:
+        _record_prices(country, data["data"]["Catalog"]["searchStore"]["elements"])
+    except (KeyError, TypeError):
+        pass  # parse_free_games reports the malformed payload
+    free_games = parse_free_games(data, settings.price_threshold)
+    if free_games is not None:
+        _save_free_games_cache(country, {
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'fetched_at': now,
+            'price_threshold': settings.price_threshold,
+            'games': free_games,
+        })
+    return free_games
+
+
+def parse_free_games(data, price_threshold=None):
+    """Extract free and discounted games under the threshold from a freeGamesPromotions payload."""
+    if price_threshold is None:
+        price_threshold = get_settings().price_threshold
     free_games = []
     try:
         games: list[dict] = data["data"]["Catalog"]["searchStore"]["elements"]
@@ -170,12 +392,12 @@ def fetch_free_games():
                 
                 # Logic: Free (0) OR Under Threshold (100 INR = 10000)
                 # Ensure we only pick items that are actually discounted or free
-                if discounted_price > PRICE_THRESHOLD:
+                if discounted_price > price_threshold:
                     continue
                 
                 # Check if it's free
                 is_free = discounted_price == 0
-                is_cheap = 0 < discounted_price <= PRICE_THRESHOLD
+                is_cheap = 0 < discounted_price <= price_threshold
 
                 if not (is_free or is_cheap):
                     continue
@@ -206,19 +428,19 @@ def fetch_free_games():
                     discounted_price_str = "Free"
                 
                 free_games.append(
-                    {
-                        "title": game.get("title"),
-                        "description": game.get(
+                    Game(
+                        title=game.get("title"),
+                        description=game.get(
                             "description", "No description available."
                         ),
-                        "original_price": original_price_str,
-                        "discounted_price": discounted_price_str,
-                        "image_url": game.get("keyImages", [{}])[0].get("url", ""),
-                        "url": f"https://store.epicgames.com/en-US/p/{url_slug}",
-                        "start_date": offer.get("startDate"),
-                        "end_date": offer.get("endDate"),
-                        "is_free": is_free
-                    }
+                        original_price=original_price_str,
+                        discounted_price=discounted_price_str,
+                        image_url=game.get("keyImages", [{}])[0].get("url", ""),
+                        url=f"https://store.epicgames.com/en-US/p/{url_slug}",
+                        start_date=offer.get("startDate"),
+                        end_date=offer.get("endDate"),
+                        is_free=is_free,
+                    )
                 )
                 # Break inner loop to avoid duplicate entries for the same game
                 break
@@ -230,172 +452,278 @@ def fetch_free_games():
 
 
 
-def fetch_cheap_games(emit_callback=None):
-    """Fetch games available under the price threshold using epicstore-api."""
-    msg = f"Fetching cheap games under {PRICE_THRESHOLD/100} {CURRENCY_CODE}..."
+def iter_catalog_pages(api, price_limit, page_size=None, max_items=None, country='IN'):
+    """
+    Yield (elements, catalog_total) pages of the store catalog sorted by price.
+    Stops after the first page whose highest price is above price_limit (every
+    later page is dearer still), once the catalog is exhausted, or once
+    max_items have been fetched.
+    """
+    if not (page_size and max_items):
+        settings = get_settings()
+        page_size = page_size or settings.catalog_page_size
+        max_items = max_items or settings.catalog_max_items
+    start = 0
+
+    while start < max_items:
+        count = min(page_size, max_items - start)
+        batch = api.fetch_store_games(
+            count=count,
+            start=start,
+            sort_by='currentPrice',
+            sort_dir='ASC',
+            allow_countries=country
+        )
+        search_store = (batch.get('data') or {}).get('Catalog', {}).get('searchStore') or {}
+        elements = search_store.get('elements') or []
+        if not elements:
+            return
+
+        catalog_total = (search_store.get('paging') or {}).get('total') or start + len(elements)
+        yield elements, catalog_total
+        start += len(elements)
+
+        if len(elements) < count or start >= catalog_total:
+            return
+
+        prices = [
+            price for price in (
+                ((game.get('price') or {}).get('totalPrice') or {}).get('discountPrice')
+                for game in elements
+            )
+            if price is not None
+        ]
+        if prices and max(prices) > price_limit:
+            return
+
+
+# A deep-search hit in one region, carried between pipeline stages
+CheapCandidate = namedtuple('CheapCandidate', ['country', 'game', 'is_free', 'is_cheap'])
+
+
+def iter_region_catalogs(countries, price_limit, settings=None):
+    """Scan every region's catalog concurrently, yielding (country, page, catalog_total) as pages arrive."""
+    settings = settings or get_settings()
+    pages = queue.Queue()
+
+    def scan(country):
+        try:
+            api = EpicGamesStoreAPI(locale='en-US', country=country, session=http_session.get_store_session())
+            for page, catalog_total in iter_catalog_pages(api, price_limit, settings.catalog_page_size,
+                                                          settings.catalog_max_items, country=country):
+                pages.put((country, page, catalog_total))
+        except Exception as e:
+            logging.error(f"Error scanning catalog for {country}: {e}")
+        finally:
+            pages.put(None)
+
+    executor = ThreadPoolExecutor(max_workers=len(countries))
+    try:
+        for country in countries:
+            executor.submit(scan, country)
+        remaining = len(countries)
+        while remaining:
+            item = pages.get()
+            if item is None:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _classify_price(country, game, settings):
+    """Return a CheapCandidate if the game's price qualifies for deep search, else None."""
+    price_info = (game.get('price') or {}).get('totalPrice')
+    # Skip if price info is missing or invalid
+    if not price_info or price_info.get('discountPrice') is None:
+        return None
+
+    discount_price = price_info['discountPrice']
+    is_free_game = discount_price == 0
+    is_cheap_game = 0 < discount_price <= settings.price_threshold and discount_price < price_info.get('originalPrice', 0)
+
+    # If deep_search_free is on, ONLY include games with price == 0
+    # Otherwise, we look for cheap discounted games (price > 0)
+    if is_free_game or (is_cheap_game and not settings.deep_search_free):
+        return CheapCandidate(country, game, is_free_game, is_cheap_game)
+    return None
+
+
+def _store_url(game):
+    """Store page URL for a catalog element, or None without a slug."""
+    url_slug = element_slug(game)
+    return f"https://store.epicgames.com/en-US/p/{url_slug}" if url_slug else None
+
+
+def _cheap_region_prices(candidate):
+    """Display prices of a candidate in its region."""
+    fmt_price = candidate.game['price']['totalPrice'].get('fmtPrice') or {}
+    return {
+        "original_price": fmt_price.get('originalPrice'),
+        "discounted_price": "Free" if candidate.is_free else fmt_price.get('discountPrice'),
+    }
+
+
+def _build_cheap_game_record(candidate, region_prices):
+    """Build the notification record for a validated candidate."""
+    game = candidate.game
+
+    # Prefer a thumbnail/wide image, otherwise the first one
+    key_images = game.get("keyImages")
+    image_url = ""
+    if key_images and isinstance(key_images, list):
+        preferred = next((img for img in key_images if img.get("type") in ("Thumbnail", "DieselStoreFrontWide")), key_images[0])
+        image_url = preferred.get("url", "")
+
+    return Game(
+        title=game.get("title"),
+        description=game.get("description", "No description available."),
+        **_cheap_region_prices(candidate),
+        image_url=image_url,
+        url=_store_url(game),
+        is_free=candidate.is_free,
+        is_cheap=candidate.is_cheap,
+        region_prices=region_prices,
+    )
+
+
+def _catalog_fingerprint(settings):
+    """Identifies the settings that decide which catalog offers qualify."""
+    return json.dumps([settings.price_threshold, settings.deep_search_free,
+                       sorted(settings.categories), sorted(settings.exclude_keywords)])
+
+
+def fetch_cheap_games(emit_callback=None, settings=None, full_scan=False):
+    """
+    Fetch games available under the price threshold in every configured region using epicstore-api.
+    With settings.catalog_incremental (and not full_scan) only offers that are new or changed
+    since the previous scan are filtered, validated and returned.
+    """
+    settings = settings or get_settings()
+    msg = f"Fetching cheap games under {settings.price_threshold/100} {settings.currency} in {', '.join(settings.countries)}..."
     if emit_callback:
         emit_callback({'type': 'log', 'message': msg})
     else:
         logging.info(msg)
 
     try:
-        api = EpicGamesStoreAPI(locale='en-US', country='IN')
-        
-        # 1. Fetch count
-        # To show progress, we need to know total. But searching provides paging. 
-        # We process a fixed amount (e.g. 1000) or pages.
-        count_to_fetch = 1000
-        
-        games_batch = api.fetch_store_games(
-            count=count_to_fetch,
-            sort_by='currentPrice', 
-            sort_dir='ASC',
-            allow_countries='IN'
-        )
-        
-        cheap_games = []
-        elements = games_batch.get('data', {}).get('Catalog', {}).get('searchStore', {}).get('elements', [])
-        total_elements = len(elements)
-        
-        if emit_callback:
-            emit_callback({'type': 'log', 'message': f"Fetched {total_elements} items. Processing filters..."})
-        
-        processed_count = 0
+        countries = list(settings.countries)
+        # The snapshot's compiled filter set stays the same for the whole run even if settings change
+        filters = settings.filters
+        filters.reset_counters()
+        url_cache = get_url_cache(settings)
+        snapshot = CatalogSnapshot(CATALOG_SNAPSHOT_FILE)
+        snapshot.begin(_catalog_fingerprint(settings))
+        incremental = settings.catalog_incremental and not full_scan
+        # Keys of candidates handed to URL validation that have not come out yet
+        awaiting_validation = {}
+        progress = {'processed': 0, 'total': 0}
+        region_totals = {}
+        # slug -> {country: prices}; shared with the records so later regions still land in them
+        region_prices = {}
         
         # Initial Progress
         if emit_callback:
-            emit_callback({'type': 'progress', 'processed': 0, 'total': total_elements})
+            emit_callback({'type': 'progress', 'processed': 0, 'total': 0})
 
-        for game in elements:
-            processed_count += 1
-            # Emit progress more frequently (every 10 items)
-            if emit_callback and processed_count % 10 == 0:
-                 emit_callback({'type': 'progress', 'processed': processed_count, 'total': total_elements})
-            
-            price_info = game.get('price', {}).get('totalPrice', {})
-            discount_price = price_info.get('discountPrice', 0)
-            original_price = price_info.get('originalPrice', 0)
-            
-            # ... (Category Filtering code remains same, omitted for brevity, logic assumed intact)
-            # We must be careful not to delete existing code if I use replace_file_content poorly.
-            # I will use a larger context or ensure I copy the inner loop logic back if I am replacing the loop.
-            
-            # To be safe and precise with replace_file_content, I will target the specific progress lines only.
-            
-    # RETRYING WITH PRECISE TARGETING IN NEXT TOOL CALL since I can't conditionally omit code blocks here.
-    # Actually I will just replace the loop start and progress emission part.
-    
-        processed_count = 0
-        if emit_callback:
-             emit_callback({'type': 'progress', 'processed': 0, 'total': total_elements})
+        def scan_catalogs(_):
+            # Pages arrive sorted by price, so each region's scan stops as soon as
+            # a page is entirely above the threshold
+            for country, page, catalog_total in iter_region_catalogs(countries, settings.price_threshold, settings):
+                region_totals[country] = min(catalog_total, settings.catalog_max_items)
+                _record_prices(country, page)
+                progress['total'] = sum(region_totals.values())
+                if emit_callback:
+                    emit_callback({'type': 'log', 'message': f"[{country}] Fetched {len(page)} items ({progress['processed'] + len(page)}/{progress['total']}). Processing filters..."})
+                for game in page:
+                    progress['processed'] += 1
+                    if emit_callback and progress['processed'] % 10 == 0:
+                        emit_callback({'type': 'progress', **progress})
+                    yield country, game
 
-        for game in elements:
-            processed_count += 1
-            if emit_callback and processed_count % 10 == 0:
-                 emit_callback({'type': 'progress', 'processed': processed_count, 'total': total_elements})
-            
-            # Apply validation filter first
-            if not is_valid_game(game):
-                continue
-            
-            price_info = game.get('price', {}).get('totalPrice', {})
-            discount_price = price_info.get('discountPrice', 0)
-            original_price = price_info.get('originalPrice', 0)
-            
-            # Skip if price info is missing or invalid
-            if price_info is None or discount_price is None:
-                continue
-            
-            # Category Filtering
-            game_categories = [c.get('path', '').lower() for c in game.get('categories', [])]
-            
-            if CATEGORIES and "All" not in CATEGORIES:
-                search_terms = [c.lower() for c in CATEGORIES]
-                match_found = False
-                for term in search_terms:
-                    for cat_path in game_categories:
-                        if term in cat_path:
-                            match_found = True
-                            break
-                    if match_found:
-                        break
-                
-                if not match_found:
-                    continue
+        def dedup(candidate):
+            # The first region to qualify a slug carries it forward; the rest only add prices
+            slug = UrlValidationCache.slug_for(_store_url(candidate.game))
+            is_new = slug not in region_prices
+            region_prices.setdefault(slug, {})[candidate.country] = _cheap_region_prices(candidate)
+            return candidate if is_new else None
 
-            # Filter logic:
-            # If DEEP_SEARCH_FREE is on, ONLY include games with price == 0
-            # Otherwise, we look for cheap discounted games (price > 0)
-            
-            is_free_game = (discount_price == 0)
-            is_cheap_game = (0 < discount_price <= PRICE_THRESHOLD and discount_price < original_price)
-            
-            should_include = False
-            if DEEP_SEARCH_FREE:
-                # Strict: only truly free games
-                if is_free_game:
-                    should_include = True
-            else:
-                # Normal mode: include cheap or free games
-                if is_cheap_game or is_free_game:
-                    should_include = True
-                
-            if should_include:
-                url_slug = game.get("urlSlug") or game.get("productSlug")
-                if not url_slug:
-                    continue
-                
-                # Build the URL
-                game_url = f"https://store.epicgames.com/en-US/p/{url_slug}"
-                
-                # CRITICAL: Validate URL before adding to results
-                if not validate_game_url(game_url):
-                    if emit_callback:
-                        emit_callback({'type': 'log', 'level': 'warning', 'message': f"Skipped invalid URL: {game.get('title')}"})
-                    continue
-                    
-                fmt_price = price_info.get('fmtPrice', {})
-                
-                # Determine display price
-                d_price = fmt_price.get('discountPrice')
-                if is_free_game:
-                    d_price = "Free"
-                
-                # Safely extract image
-                key_images = game.get("keyImages", [])
-                image_url = ""
-                if key_images and isinstance(key_images, list):
-                    for img in key_images:
-                        if img.get("type") == "Thumbnail" or img.get("type") == "DieselStoreFrontWide":
-                            image_url = img.get("url", "")
-                            break
-                    if not image_url and key_images:
-                         image_url = key_images[0].get("url", "")
-                
-                # Determine display price labels
-                original_price_str = fmt_price.get('originalPrice')
-                discounted_price_str = "Free" if is_free_game else fmt_price.get('discountPrice')
-
-                found_game = {
-                    "title": game.get("title"),
-                    "description": game.get("description", "No description available."),
-                    "original_price": original_price_str,
-                    "discounted_price": discounted_price_str,
-                    "image_url": image_url,
-                    "url": game_url,  # Use pre-validated URL
-                    "start_date": None,
-                    "end_date": None,
-                    "is_free": is_free_game,
-                    "is_cheap": is_cheap_game
-                }
-                
+        def track(candidates):
+            for candidate in candidates:
+                awaiting_validation[item_key(candidate.country, candidate.game)] = candidate
+                yield candidate
+
+        def validate_urls(candidates):
+            # CRITICAL: Validate URLs before adding to results
+            return validate_game_urls(
+                ((_store_url(candidate.game), candidate.game.get('title'), candidate) for candidate in track(candidates)),
+                emit_callback,
+                max_workers=settings.url_validation_workers,
+                time_budget=settings.url_validation_budget,
+                cache=url_cache,
+            )
+
+        def build_record(candidate):
+            awaiting_validation.pop(item_key(candidate.country, candidate.game), None)
+            slug = UrlValidationCache.slug_for(_store_url(candidate.game))
+            return _build_cheap_game_record(candidate, region_prices[slug])
+
+        stages = [
+            PipelineStage('source', scan_catalogs),
+            # Every offer is recorded in the snapshot; unchanged ones stop here when incremental
+            filter_stage('changes', lambda item: snapshot.changed(*item) or not incremental),
+            filter_stage('validity', lambda item: filters.is_valid_game(item[1])),
+            map_stage('price', lambda item: _classify_price(*item, settings)),
+            filter_stage('category', lambda candidate: filters.matches_category(candidate.game)),
+            map_stage('dedup', dedup),
+            PipelineStage('url_validation', validate_urls),
+            map_stage('record', build_record),
+        ]
+        cheap_games = []
+        try:
+            for found_game in run_pipeline((), stages):
                 cheap_games.append(found_game)
-                
                 if emit_callback:
                     emit_callback({'type': 'found', 'game': found_game})
+        finally:
+            url_cache.save()
+            get_price_history().flush()
+
+        # Invalid or unchecked URLs are evaluated again next time (cheaply, via the URL cache)
+        for candidate in awaiting_validation.values():
+            snapshot.forget(candidate.country, candidate.game)
+        snapshot.save()
+        sync_msg = (f"Catalog sync: {snapshot.counts['new']} new, {snapshot.counts['changed']} changed, "
+                    f"{snapshot.counts['unchanged']} unchanged"
+                    f"{' (skipped)' if incremental else ''}")
+        if emit_callback:
+            emit_callback({'type': 'log', 'level': 'info', 'message': sync_msg})
+        logging.info(sync_msg)
+        for change, count in snapshot.counts.items():
+            emit_metric(emit_callback, 'notifier_catalog_items_total', count, kind='counter',
+                        help_text="Catalog offers seen by deep search, by change since the last scan", change=change)
+
+        for stage in stages:
+            stats = stage.stats()
+            stage_msg = (f"Stage {stats['stage']}: {stats['items_in']} in, "
+                         f"{stats['items_out']} out, {stats['seconds']:.2f}s")
+            if emit_callback:
+                emit_callback({'type': 'log', 'level': 'info', 'message': stage_msg, 'stage': stats})
+            logging.info(stage_msg)
+            emit_metric(emit_callback, 'notifier_pipeline_stage_seconds', stats['seconds'],
+                        help_text="Self time of each deep search pipeline stage", stage=stats['stage'])
+            emit_metric(emit_callback, 'notifier_pipeline_items_total', stats['items_out'], kind='counter',
+                        help_text="Items passed by each deep search pipeline stage", stage=stats['stage'])
+        for rule, hits in filters.stats().items():
+            emit_metric(emit_callback, 'notifier_filter_hits_total', hits, kind='counter',
+                        help_text="Games rejected by each filter rule", rule=rule)
+        logging.info(f"URL cache: {url_cache.hits} hits, {url_cache.misses} misses")
+        logging.info(f"Filter hits: {filters.stats()}")
+        http_session.log_connection_stats()
         
         if emit_callback:
-            emit_callback({'type': 'progress', 'processed': total_elements, 'total': total_elements})
+            emit_callback({'type': 'progress', 'processed': progress['processed'], 'total': progress['processed']})
 
         return cheap_games
 
@@ -406,12 +734,8 @@ def fetch_cheap_games(emit_callback=None):
         logging.error(err_msg)
         return []
 
-def send_email(free_games):
-    """Send an email with details about free games."""
-    if not free_games:
-        logging.info("No games to notify.")
-        return False  # Changed to return False instead of None
-
+def build_email_message(free_games):
+    """Build the HTML notification email for a list of games."""
     subject = "Free & Cheap Games on Epic Games Store!"
     
     # Modern, professional, and responsive email body with a border
@@ -509,24 +833,23 @@ def send_email(free_games):
             <div class="content">
     """
     # Build the email body with the game's details, including image, description, and price
-    for game in free_games:
+    for game in map(Game.from_dict, free_games):
         date_str = ""
-        if game.get("end_date"):
-            end_date = format_date(game["end_date"])
-            date_str = f"<i>Offer ends: {end_date}</i>"
+        if game.end_date:
+            date_str = f"<i>Offer ends: {game.end_date_display}</i>"
         
-        price_display = f"Price: <span style='background-color: red; color: white;'>{game['discounted_price']}</span> (was {game['original_price']})"
-        if game.get("is_free"):
-             price_display = f"Price: <span>Free</span> (was {game['original_price']})"
+        price_display = f"Price: <span style='background-color: red; color: white;'>{game.discounted_price}</span> (was {game.original_price})"
+        if game.is_free:
+             price_display = f"Price: <span>Free</span> (was {game.original_price})"
              
         body += f"""
         <div class="game">
-            <img src="{game['image_url']}" alt="{game['title']}" />
+            <img src="{game.image_url}" alt="{game.title}" />
             <div class="game-details">
-                <h3>{game['title']}</h3>
-                <p>{game['description']}</p>
+                <h3>{game.title}</h3>
+                <p>{game.description}</p>
                 <p class="price">{price_display}</p>
-                <a href="{game['url']}">{'Claim Your Free Game!' if game.get('is_free') else 'Get This Deal Now!'}</a>
+                <a href="{game.url}">{'Claim Your Free Game!' if game.is_free else 'Get This Deal Now!'}</a>
                 <p class="offer-end">{date_str}</p>
             </div>
         </div>
@@ -543,90 +866,216 @@ def send_email(free_games):
     msg["From"] = f"Epic Free Games Notifier <{FROM_EMAIL}>"
     msg["Subject"] = subject
     msg.attach(MIMEText(body, "html"))
+    return msg
+
+
+def get_delivery_engine(settings=None):
+    """Create an SMTP delivery engine using the given (or current) settings."""
+    settings = settings or get_settings()
+    return SmtpDeliveryEngine(
+        SMTP_SERVER,
+        int(SMTP_PORT),
+        username=EMAIL,
+        password=PASSWORD,
+        workers=settings.smtp_workers,
+        rate_limit=settings.smtp_rate_limit,
+        use_starttls=os.getenv("SMTP_STARTTLS", "true").lower() != "false",
+    )
+
+
+def get_recipients(settings=None):
+    """Notification recipients from settings, falling back to TO_EMAIL."""
+    emails = list((settings or get_settings()).emails)
+    return emails if emails else ([TO_EMAIL] if TO_EMAIL else [])
+
+
+def get_outbox(settings=None):
+    """Open the durable email outbox using the given (or current) settings."""
+    settings = settings or get_settings()
+    return Outbox(OUTBOX_FILE, max_attempts=settings.outbox_max_attempts, retry_backoff=settings.outbox_retry_backoff)
+
+
+def drain_outbox(outbox=None, loop=False, emit=None, settings=None):
+    """
+    Send every due job in the outbox, marking each one done or failed as it completes.
+    With loop=True keeps running until nothing is pending, sleeping until the next retry.
+    Returns the outbox stats after the last pass.
+    """
+    outbox = outbox or get_outbox(settings)
+    while True:
+        due = outbox.due_jobs()
+        by_digest = {}
+        for job in due:
+            by_digest.setdefault(job['digest'], []).append(job)
 
-    recipients = EMAILS if EMAILS else ([TO_EMAIL] if TO_EMAIL else [])
+        if due:
+            engine = get_delivery_engine(settings)
+        for digest_id, jobs in by_digest.items():
+            job_ids = {job['recipient']: job['id'] for job in jobs}
+
+            def on_result(result):
+                if result.success:
+                    outbox.mark_done(job_ids[result.recipient])
+                else:
+                    outbox.mark_failed(job_ids[result.recipient], result.error)
+                emit_metric(emit, 'notifier_emails_total', 1, kind='counter',
+                            help_text="Email delivery attempts by outcome",
+                            result='sent' if result.success else 'failed')
+
+            msg_text = f"Sending queued email to {len(jobs)} recipient(s)..."
+            if emit:
+                emit({'type': 'log', 'level': 'info', 'message': msg_text})
+            else:
+                logging.info(msg_text)
+            try:
+                msg = build_email_message([Game.from_dict(game) for game in outbox.digests[digest_id]])
+                engine.deliver(FROM_EMAIL, msg, list(job_ids), on_result=on_result)
+            except Exception as e:
+                logging.error(f"Failed to send queued email: {e}")
+                for job in jobs:
+                    outbox.mark_failed(job['id'], str(e))
+
+        stats = outbox.stats()
+        if not stats['pending']:
+            outbox.compact()
+        next_due = outbox.next_due_at()
+        if not loop or next_due is None:
+            return stats
+        time.sleep(max(1, next_due - time.time()))
+
+
+def drain_outbox_forever(poll_interval=OUTBOX_POLL_INTERVAL):
+    """
+    Background delivery loop: drains the outbox whenever a job is due, and at
+    once when a run in this process queues mail. Never returns.
+    """
+    while True:
+        _outbox_queued.clear()
+        next_due = None
+        try:
+            settings = get_settings()
+            outbox = get_outbox(settings)
+            drain_outbox(outbox, settings=settings)
+            next_due = outbox.next_due_at()
+        except Exception as e:
+            logging.error(f"Outbox drainer failed: {e}")
+        timeout = poll_interval if next_due is None else min(poll_interval, max(1, next_due - time.time()))
+        _outbox_queued.wait(timeout)
+
+
+def start_outbox_drainer():
+    """Deliver queued emails from a daemon thread of this process (started once)"""
+    global _outbox_drainer
+    if _outbox_drainer is None:
+        _outbox_drainer = threading.Thread(target=drain_outbox_forever, name='outbox-drainer', daemon=True)
+        _outbox_drainer.start()
+    return _outbox_drainer
+
+
+def send_email(free_games, recipients=None, settings=None):
+    """Send an email with details about free games."""
+    settings = settings or get_settings()
+    if not free_games:
+        logging.info("No games to notify.")
+        return False  # Changed to return False instead of None
+
+    if recipients is None:
+        recipients = get_recipients(settings)
     
     if not recipients:
         logging.error("No recipients found.")
         return False
 
     try:
-        logging.info("Connecting to SMTP server...")
-        with smtplib.SMTP(SMTP_SERVER, int(SMTP_PORT)) as server:
-            server.set_debuglevel(1)  # Enable debug logs
-            server.starttls()
-            logging.info("Logging in to SMTP server...")
-            server.login(EMAIL, PASSWORD)
-            
-            for recipient in recipients:
-                msg["To"] = recipient
-                logging.info(f"Sending email to {recipient}...")
-                server.send_message(msg)
-                
-            logging.info("Emails sent successfully.")
-            return True  # Return True on successful send
+        msg = build_email_message(free_games)
+        logging.info(f"Sending email to {len(recipients)} recipient(s) over up to {settings.smtp_workers} SMTP connection(s)...")
+        results = get_delivery_engine(settings).deliver(FROM_EMAIL, msg, recipients)
     except Exception as e:
         logging.error(f"Failed to send email: {e}")
         return False  # Return False if sending fails
 
+    for result in results:
+        if result.success:
+            logging.info(f"Sent email to {result.recipient} ({result.attempts} attempt(s))")
+        else:
+            logging.error(f"Failed to send email to {result.recipient}: {result.error}")
+        emit_metric(None, 'notifier_emails_total', 1, kind='counter', help_text="Email delivery attempts by outcome",
+                    result='sent' if result.success else 'failed')
+
+    if all(result.success for result in results):
+        logging.info("Emails sent successfully.")
+        return True  # Return True on successful send
+    return False
+
+
+def get_history_store(history_file="notification_history.json", settings=None):
+    """Shared notification history store with the configured retention policy."""
+    settings = settings or get_settings()
+    return get_notification_history(
+        history_file,
+        undated_retention_days=settings.history_undated_retention_days,
+        max_entries=settings.history_max_entries,
+    )
+
+
+def compact_notification_history(history_file="notification_history.json", settings=None):
+    """Drop expired and excess history entries; returns how many records were dropped."""
+    try:
+        return get_history_store(history_file, settings).compact()
+    except Exception as e:
+        logging.error(f"Error compacting notification history: {e}")
+        return 0
+
 
-def manage_notification_history(games, history_file="notification_history.json", update_history=True):
+def compact_price_history(settings=None):
+    """Drop price points past the retention period; returns how many records were dropped."""
+    settings = settings or get_settings()
+    try:
+        store = get_price_history()
+        store.retention_days = settings.price_history_retention_days
+        return store.compact()
+    except Exception as e:
+        logging.error(f"Error compacting price history: {e}")
+        return 0
+
+
+def manage_notification_history(games, history_file="notification_history.json", update_history=True, settings=None):
     """Manage notification history to avoid duplicate notifications."""
     try:
-        # Create history file if it doesn't exist
-        history_path = Path(history_file)
-        if not history_path.exists():
-            history_path.write_text('{"notified_games": []}')
-
-        # Read existing history
-        with open(history_file, 'r') as f:
-            history = json.load(f)
+        history = get_history_store(history_file, settings)
+        history.refresh()
         
-        # Clean up old entries (older than 30 days)
-        current_time = datetime.datetime.now()
-        history['notified_games'] = [
-            game_id for game_id in history['notified_games']
-            if not _is_old_notification(game_id, current_time)
-        ]
-        
-        # Filter out games we've already notified about
+        # Filter out games we've already notified about (entries expire 30 days after the offer
+        # ends, or after the undated retention period for games without an end date)
         new_games = []
-        new_game_ids = []  # Store new game IDs separately
-        for game in games:
-            game_id = f"{game['title']}_{game['end_date']}"
-            if game_id not in history['notified_games']:
+        new_game_ids = {}  # New game ID -> pre-parsed end epoch
+        for game in map(Game.from_dict, games):
+            game_id = game.game_id
+            if not history.is_notified(game_id):
                 new_games.append(game)
-                new_game_ids.append(game_id)
+                new_game_ids[game_id] = game.end_ts
         
-        # Only update history file if requested and there are new games
+        # Only update history if requested and there are new games
         if update_history and new_game_ids:
-            history['notified_games'].extend(new_game_ids)
-            with open(history_file, 'w') as f:
-                json.dump(history, f, indent=2)
+            history.add(new_game_ids, end_ts=new_game_ids)
         
         return new_games
     except Exception as e:
         logging.error(f"Error managing notification history: {e}")
         return games  # Return all games if there's an error
 
-def _is_old_notification(game_id, current_time):
-    """Check if a notification is older than 30 days."""
-    try:
-        # Extract end_date from game_id (format: "title_end_date")
-        end_date_str = game_id.split('_')[-1]
-        end_date = datetime.datetime.strptime(end_date_str, "%Y-%m-%dT%H:%M:%S.000Z")
-        return (current_time - end_date).days > 30
-    except Exception:
-        return False  # Keep entry if we can't parse the date
-
 
 
 
-def run_process(callback=None):
+def run_process(callback=None, profile=None, settings=None):
     """
     Main execution function with callback support for web interface.
-    callback(data): data is a dict with keys: type (log, progress, found), message, etc.
+    callback(data): data is a dict with keys: type (log, progress, found), message, etc.;
+    found events carry the Game record itself (to_dict() for the JSON shape).
+    profile: True/False forces CPU and memory profiling on or off; None defers to NOTIFIER_PROFILE.
+    settings: Snapshot used for the whole run; defaults to the current one.
     """
+    settings = settings or get_settings()
     def emit(data):
         if callback:
             callback(data)
@@ -640,87 +1089,145 @@ def run_process(callback=None):
             else:
                 logging.info(data.get('message'))
         
-    try:
-        # Check environment variables first
-        check_env_variables()
+    with profile_run('run_process', emit, enabled=profile):
+        run_started = time.perf_counter()
+        try:
+            # Check environment variables first
+            check_env_variables()
         
-        emit({'type': 'log', 'level': 'info', 'message': "Starting scraper process..."})
+            emit({'type': 'log', 'level': 'info', 'message': "Starting scraper process..."})
         
-        # 1. Fetch Weekly Free Games Only
-        emit({'type': 'log', 'level': 'info', 'message': "Fetching weekly free games..."})
-        free_games = fetch_free_games() or []
-        for g in free_games:
-            emit({'type': 'found', 'game': g})
-        emit({'type': 'progress', 'processed': len(free_games), 'total': len(free_games)})
+            # 1. Fetch Weekly Free Games Only
+            emit({'type': 'log', 'level': 'info', 'message': "Fetching weekly free games..."})
+            with phase(emit, 'fetch_free_games'):
+                free_games = fetch_free_games(settings) or []
+            http_session.log_connection_stats()
+            for g in free_games:
+                emit({'type': 'found', 'game': g})
+            emit({'type': 'progress', 'processed': len(free_games), 'total': len(free_games)})
+            emit_metric(emit, 'notifier_games_found_total', len(free_games), kind='counter',
+                        help_text="Games found by scraper runs", source='free')
         
-        if free_games:
-            # First check for new games without updating history
-            new_games = manage_notification_history(free_games, update_history=False)
+            new_games = []
+            if free_games:
+                # First check for new games without updating history
+                with phase(emit, 'history_check'):
+                    new_games = manage_notification_history(free_games, update_history=False, settings=settings)
             
-            if new_games:
-                emit({'type': 'log', 'level': 'success', 'message': f"Found {len(new_games)} new games to notify! Sending email..."})
-                if send_email(new_games):
-                    # Only update history if email was sent successfully
-                    manage_notification_history(new_games)
-                    emit({'type': 'log', 'level': 'success', 'message': "Email sent and history updated."})
-                    emit({'type': 'status', 'status': 'success'})
+                if new_games:
+                    recipients = get_recipients(settings)
+                    if not recipients:
+                        emit({'type': 'log', 'level': 'error', 'message': "No recipients found."})
+                        emit({'type': 'status', 'status': 'error'})
+                        emit_metric(emit, 'notifier_runs_total', 1, kind='counter', help_text="Scraper runs by outcome",
+                                    run='process', status='error')
+                        return
+                    emit({'type': 'log', 'level': 'success', 'message': f"Found {len(new_games)} new games to notify! Queuing email..."})
+                    # Once queued, the outbox owns delivery, so history is updated right away
+                    # and a flaky mail server never causes a full resend
+                    with phase(emit, 'enqueue'):
+                        get_outbox(settings).enqueue(new_games, recipients)
+                    _outbox_queued.set()
+                    with phase(emit, 'history_update'):
+                        manage_notification_history(new_games, settings=settings)
                 else:
-                    emit({'type': 'log', 'level': 'warning', 'message': "Email failed to send."})
-                    emit({'type': 'status', 'status': 'error'})
+                    emit({'type': 'log', 'level': 'info', 'message': "No new games (all already notified)."})
             else:
-                emit({'type': 'log', 'level': 'info', 'message': "No new games (all already notified)."})
-                emit({'type': 'status', 'status': 'success'})
-        else:
-            emit({'type': 'log', 'level': 'info', 'message': "No interesting games found this run."})
+                emit({'type': 'log', 'level': 'info', 'message': "No interesting games found this run."})
+            emit_metric(emit, 'notifier_new_games_total', len(new_games), kind='counter',
+                        help_text="Games not notified before")
+
+            with phase(emit, 'compact_history'):
+                dropped = compact_notification_history(settings=settings)
+            if dropped:
+                emit({'type': 'log', 'level': 'info', 'message': f"Compacted notification history: dropped {dropped} stale entries."})
+            with phase(emit, 'compact_price_history'):
+                dropped = compact_price_history(settings=settings)
+            if dropped:
+                emit({'type': 'log', 'level': 'info', 'message': f"Compacted price history: dropped {dropped} old price points."})
+
+            # Delivery is left to the outbox drainer, so SMTP never holds up the run
+            if new_games:
+                emit({'type': 'log', 'level': 'success', 'message': "Email queued for delivery and history updated."})
             emit({'type': 'status', 'status': 'success'})
+            emit_metric(emit, 'notifier_runs_total', 1, kind='counter', help_text="Scraper runs by outcome",
+                        run='process', status='success')
 
-    except Exception as e:
-        emit({'type': 'error', 'message': str(e)})
-        emit({'type': 'log', 'level': 'error', 'message': f"FAILED: {e}"})
-        logging.error(f"Script failed: {e}")
+        except Exception as e:
+            emit_metric(emit, 'notifier_runs_total', 1, kind='counter', help_text="Scraper runs by outcome",
+                        run='process', status='failed')
+            emit({'type': 'error', 'message': str(e)})
+            emit({'type': 'log', 'level': 'error', 'message': f"FAILED: {e}"})
+            logging.error(f"Script failed: {e}")
+        finally:
+            emit_metric(emit, 'notifier_run_seconds', round(time.perf_counter() - run_started, 6),
+                        help_text="Wall time of whole scraper runs", run='process')
 
-def force_send_notifications(callback=None):
+def force_send_notifications(callback=None, profile=None, settings=None):
     """Force send notifications for all current free games, bypassing history check"""
-    load_settings()
+    settings = settings or get_settings()
     
     def emit(data):
         if callback:
             callback(data)
-        else:
+        elif data.get('type') != 'metric':
             print(f"[{data.get('type', 'log')}] {data.get('message', data)}")
     
-    try:
-        emit({'type': 'log', 'level': 'info', 'message': "Force sending notifications..."})
-        emit({'type': 'log', 'level': 'info', 'message': "Fetching current free games..."})
+    with profile_run('force_send_notifications', emit, enabled=profile):
+        run_started = time.perf_counter()
+        status = 'failed'
+        try:
+            emit({'type': 'log', 'level': 'info', 'message': "Force sending notifications..."})
+            emit({'type': 'log', 'level': 'info', 'message': "Fetching current free games..."})
         
-        free_games = fetch_free_games() or []
-        for g in free_games:
-            emit({'type': 'found', 'game': g})
-        emit({'type': 'progress', 'processed': len(free_games), 'total': len(free_games)})
+            with phase(emit, 'fetch_free_games'):
+                free_games = fetch_free_games(settings) or []
+            for g in free_games:
+                emit({'type': 'found', 'game': g})
+            emit({'type': 'progress', 'processed': len(free_games), 'total': len(free_games)})
+            emit_metric(emit, 'notifier_games_found_total', len(free_games), kind='counter',
+                        help_text="Games found by scraper runs", source='free')
         
-        if free_games:
-            emit({'type': 'log', 'level': 'success', 'message': f"Sending email for {len(free_games)} games..."})
-            if send_email(free_games):
-                manage_notification_history(free_games)
-                emit({'type': 'log', 'level': 'success', 'message': f"Email sent successfully to {len(EMAILS)} recipient(s)!"})
-                emit({'type': 'status', 'status': 'success'})
+            if free_games:
+                emit({'type': 'log', 'level': 'success', 'message': f"Sending email for {len(free_games)} games..."})
+                with phase(emit, 'smtp'):
+                    sent = send_email(free_games, settings=settings)
+                if sent:
+                    with phase(emit, 'history_update'):
+                        manage_notification_history(free_games, settings=settings)
+                    emit({'type': 'log', 'level': 'success', 'message': f"Email sent successfully to {len(get_recipients(settings))} recipient(s)!"})
+                    emit({'type': 'status', 'status': 'success'})
+                    status = 'success'
+                else:
+                    emit({'type': 'log', 'level': 'error', 'message': "Failed to send email. Check SMTP settings in .env file."})
+                    emit({'type': 'status', 'status': 'error'})
+                    status = 'error'
             else:
-                emit({'type': 'log', 'level': 'error', 'message': "Failed to send email. Check SMTP settings in .env file."})
-                emit({'type': 'status', 'status': 'error'})
-        else:
-            emit({'type': 'log', 'level': 'warning', 'message': "No free games available to notify about."})
-            emit({'type': 'status', 'status': 'success'})
+                emit({'type': 'log', 'level': 'warning', 'message': "No free games available to notify about."})
+                emit({'type': 'status', 'status': 'success'})
+                status = 'success'
             
-    except Exception as e:
-        emit({'type': 'error', 'message': str(e)})
-        emit({'type': 'log', 'level': 'error', 'message': f"FAILED: {e}"})
-        logging.error(f"Force send failed: {e}")
+        except Exception as e:
+            emit({'type': 'error', 'message': str(e)})
+            emit({'type': 'log', 'level': 'error', 'message': f"FAILED: {e}"})
+            logging.error(f"Force send failed: {e}")
+        finally:
+            emit_metric(emit, 'notifier_runs_total', 1, kind='counter', help_text="Scraper runs by outcome",
+                        run='force', status=status)
+            emit_metric(emit, 'notifier_run_seconds', round(time.perf_counter() - run_started, 6),
+                        help_text="Wall time of whole scraper runs", run='force')
 
 
 def main():
     """CLI entry point"""
-    load_settings()
-    run_process()
+    settings = load_settings()
+    if "--drain" in sys.argv:
+        # Standalone delivery loop: sends queued emails until the outbox is empty
+        drain_outbox(loop=True, settings=settings)
+        return
+    run_process(profile=True if "--profile" in sys.argv else None, settings=settings)
+    # A one-shot (cron) run has no background drainer, so send what it queued before exiting
+    drain_outbox(settings=settings)
 
 
 
@@ -1,14 +1,27 @@
 """
 Database abstraction layer - supports JSON, MongoDB, or Hybrid
 """
+import copy
 import json
 import os
+import threading
+import time
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
+
+from game import Game
+from settings import get_settings_store, parse_settings
+
+# Found games are added to the history in batches of this many, or after this many seconds
+HISTORY_BATCH_SIZE = 25
+HISTORY_FLUSH_INTERVAL = 2.0
+
+# Seconds a MongoDB read is served from memory; other processes' writes show up after at most this long
+MONGO_CACHE_TTL = float(os.getenv('DB_CACHE_TTL', '5'))
 
 # MongoDB support (optional)
 try:
-    from pymongo import MongoClient
+    from pymongo import MongoClient, UpdateOne
     MONGODB_AVAILABLE = True
 except ImportError:
     MONGODB_AVAILABLE = False
@@ -16,18 +29,25 @@ except ImportError:
 class DatabaseManager:
     """Manages data storage across JSON files and/or MongoDB"""
     
-    def __init__(self, mode='json', mongodb_url=None):
+    def __init__(self, mode='json', mongodb_url=None, cache_ttl=MONGO_CACHE_TTL):
         """
         Initialize database manager
         
         Args:
             mode: 'json', 'mongodb', or 'hybrid'
             mongodb_url: MongoDB connection string
+            cache_ttl: Seconds reads are cached when they come from MongoDB
         """
         self.mode = mode
         self.mongodb_url = mongodb_url
         self.mongo_client = None
         self.db = None
+        self.cache_ttl = cache_ttl
+        # Collection name -> (parsed data, validator); the validator is the JSON file's
+        # (mtime_ns, size) or, when MongoDB is read, the monotonic expiry time
+        self._cache: Dict[str, tuple] = {}
+        self._cache_lock = threading.Lock()
+        self._history_lock = threading.Lock()  # Serializes read-modify-write of the games history
         
         # File paths
         self.settings_file = 'settings.json'
@@ -46,9 +66,68 @@ class DatabaseManager:
                     print("⚠️  Falling back to JSON mode")
                     self.mode = 'json'
     
+    # Read cache
+    def _uses_mongo(self) -> bool:
+        return self.mode in ['mongodb', 'hybrid'] and self.db is not None
+
+    @staticmethod
+    def _file_signature(path: str):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _validator(self, path: str):
+        if self._uses_mongo():
+            return ('ttl', time.monotonic() + self.cache_ttl)
+        return ('file', self._file_signature(path))
+
+    def _is_fresh(self, validator, path: str) -> bool:
+        kind, value = validator
+        if kind == 'ttl':
+            return time.monotonic() < value
+        return value == self._file_signature(path)
+
+    def _read_cached(self, name: str, path: str, load):
+        """Parsed collection from memory, loaded again only if the file changed or the TTL ran out"""
+        with self._cache_lock:
+            cached = self._cache.get(name)
+            if cached is not None and self._is_fresh(cached[1], path):
+                return cached[0]
+        # Take the validator before loading, so a write landing meanwhile is picked up next time
+        validator = self._validator(path)
+        data = load()
+        with self._cache_lock:
+            self._cache[name] = (data, validator)
+        return data
+
+    @staticmethod
+    def _write_json_atomic(path: str, data):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def _cache_put(self, name: str, path: str, data):
+        """Write-through: remember what was just written"""
+        with self._cache_lock:
+            self._cache[name] = (data, self._validator(path))
+
+    def invalidate_cache(self):
+        """Drop every cached collection"""
+        with self._cache_lock:
+            self._cache.clear()
+
     # Settings Management
     def read_settings(self) -> Dict:
         """Read settings from storage"""
+        if self._uses_mongo():
+            return copy.deepcopy(self._read_cached('settings', self.settings_file, self._load_settings))
+        # JSON fallback or primary, served from the shared snapshot cache; callers get their own copy
+        return copy.deepcopy(get_settings_store(self.settings_file).raw())
+
+    def _load_settings(self) -> Dict:
         if self.mode in ['mongodb', 'hybrid'] and self.db:
             try:
                 doc = self.db.settings.find_one({'_id': 'main'})
@@ -58,14 +137,12 @@ class DatabaseManager:
             except Exception as e:
                 print(f"MongoDB read error: {e}")
         
-        # JSON fallback or primary
-        if os.path.exists(self.settings_file):
-            with open(self.settings_file, 'r') as f:
-                return json.load(f)
-        return {}
+        # JSON fallback
+        return dict(get_settings_store(self.settings_file).raw())
     
     def write_settings(self, data: Dict):
         """Write settings to storage"""
+        parse_settings(data)  # Validate before any copy is written
         if self.mode in ['mongodb', 'hybrid'] and self.db:
             try:
                 data_copy = data.copy()
@@ -79,14 +156,17 @@ class DatabaseManager:
             except Exception as e:
                 print(f"MongoDB write error: {e}")
         
-        # JSON write (always for json/hybrid)
+        # JSON write (always for json/hybrid); also refreshes the cached snapshot
         if self.mode in ['json', 'hybrid']:
-            with open(self.settings_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            get_settings_store(self.settings_file).write(data)
+        self._cache_put('settings', self.settings_file, copy.deepcopy(data))
     
     # User Emails Management
     def read_user_emails(self) -> Dict:
-        """Read user email mappings"""
+        """Read user email mappings (a copy of the cached mapping)"""
+        return dict(self._read_cached('user_emails', self.user_emails_file, self._load_user_emails))
+
+    def _load_user_emails(self) -> Dict:
         if self.mode in ['mongodb', 'hybrid'] and self.db:
             try:
                 result = {}
@@ -125,10 +205,14 @@ class DatabaseManager:
         if self.mode in ['json', 'hybrid']:
             with open(self.user_emails_file, 'w') as f:
                 json.dump(data, f, indent=2)
+        self._cache_put('user_emails', self.user_emails_file, dict(data))
     
     # Games History Management
     def read_games_history(self) -> List[Dict]:
-        """Read games history"""
+        """Read games history (a new list; the game dicts are shared with the cache, do not modify them)"""
+        return list(self._read_cached('games_history', self.games_history_file, self._load_games_history))
+
+    def _load_games_history(self) -> List[Dict]:
         if self.mode in ['mongodb', 'hybrid'] and self.db:
             try:
                 games = list(self.db.games_history.find().sort('found_date', -1))
@@ -145,52 +229,74 @@ class DatabaseManager:
                 return json.load(f)
         return []
     
-    def write_games_history(self, data: List[Dict]):
-        """Write games history"""
+    def write_games_history(self, data: List[Union[Game, Dict]]):
+        """Write games history (Game records or their dict form)"""
+        data = [game.to_dict() if isinstance(game, Game) else game for game in data]
         if self.mode in ['mongodb', 'hybrid'] and self.db:
             try:
                 # Clear and rewrite
                 self.db.games_history.delete_many({})
                 if data:
-                    for game in data:
-                        game_copy = game.copy()
-                        if 'found_date' not in game_copy:
-                            game_copy['found_date'] = datetime.now().isoformat()
-                        self.db.games_history.insert_one(game_copy)
+                    now = datetime.now().isoformat()
+                    self.db.games_history.insert_many([dict(game, found_date=game.get('found_date') or now) for game in data])
             except Exception as e:
                 print(f"MongoDB write error: {e}")
         
         # JSON write
         if self.mode in ['json', 'hybrid']:
-            with open(self.games_history_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with self._history_lock:
+                self._write_json_atomic(self.games_history_file, data)
+        self._cache_put('games_history', self.games_history_file, data)
     
-    def add_game_to_history(self, game: Dict) -> List[Dict]:
-        """Add a single game to history"""
-        history = self.read_games_history()
-        
-        # Add timestamp
-        if 'found_date' not in game:
-            game['found_date'] = datetime.now().isoformat()
-        
-        # Check if exists
-        existing = next((g for g in history if g.get('title') == game.get('title')), None)
-        
-        if not existing:
+    def add_game_to_history(self, game: Union[Game, Dict]) -> List[Dict]:
+        """Add a single game (Game record or its dict form) to history"""
+        return self.add_games_to_history([game])
+
+    def add_games_to_history(self, games: List[Union[Game, Dict]]) -> List[Dict]:
+        """
+        Add a batch of games (Game records or their dict form) to history, skipping
+        titles already present. The new games go first, newest first, with one
+        file write (and one MongoDB bulk upsert) for the whole batch.
+        """
+        with self._history_lock:
+            history = self.read_games_history()
+            titles = {g.get('title') for g in history}
+            now = datetime.now().isoformat()
+            records = []
+            for game in games:
+                # Serialized rather than parsed: only the title and found date matter here,
+                # and the caller's Game records are left untouched
+                record = game.to_dict() if isinstance(game, Game) else dict(game)
+                title = record.get('title')
+                if not title:
+                    print(f"Skipping history record without a title: {record!r}")
+                    continue
+                if title in titles:
+                    continue
+                titles.add(title)
+                if record.get('found_date') is None:
+                    record['found_date'] = now
+                records.append(record)
+            if not records:
+                return history
+            records.reverse()
+
             if self.mode in ['mongodb', 'hybrid'] and self.db:
                 try:
-                    game_copy = game.copy()
-                    self.db.games_history.insert_one(game_copy)
+                    # Upsert by title, so games another process already added are left alone
+                    self.db.games_history.bulk_write(
+                        [UpdateOne({'title': record['title']}, {'$setOnInsert': dict(record)}, upsert=True)
+                         for record in records],
+                        ordered=False,
+                    )
                 except Exception as e:
                     print(f"MongoDB insert error: {e}")
-            
-            history.insert(0, game)
-            
+
+            history = records + history
             if self.mode in ['json', 'hybrid']:
-                with open(self.games_history_file, 'w') as f:
-                    json.dump(history, f, indent=2)
-        
-        return history
+                self._write_json_atomic(self.games_history_file, history)
+            self._cache_put('games_history', self.games_history_file, list(history))
+            return history
     
     def get_stats(self) -> Dict:
         """Get database statistics"""
@@ -216,6 +322,43 @@ class DatabaseManager:
         if self.mongo_client:
             self.mongo_client.close()
 
+class GamesHistoryWriter:
+    """Buffers found games and adds them with add_games_to_history every max_games games or max_delay seconds"""
+
+    def __init__(self, db: DatabaseManager, max_games: int = HISTORY_BATCH_SIZE,
+                 max_delay: float = HISTORY_FLUSH_INTERVAL):
+        self.db = db
+        self.max_games = max_games
+        self.max_delay = max_delay
+        self._buffer = []
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def add(self, game: Union[Game, Dict]):
+        with self._lock:
+            self._buffer.append(game)
+            full = len(self._buffer) >= self.max_games
+            if not full and self._timer is None:
+                self._timer = threading.Timer(self.max_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def flush(self) -> int:
+        """Write the buffered games now; returns how many were handed to the database"""
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if batch:
+            try:
+                self.db.add_games_to_history(batch)
+            except Exception as e:
+                print(f"Games history write error: {e}")
+        return len(batch)
+
 # Global instance
 db_manager = None
 
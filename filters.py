@@ -0,0 +1,104 @@
+"""
+Game filter engine - matchers compiled once per settings load
+"""
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_EXCLUDE_KEYWORDS = ["dlc", " pack", "bundle", "skin", "add-on", "expansion"]
+DEV_AUDIENCE_PATTERNS = ["audience", "dev ", " dev"]
+
+
+def _compile_literals(literals: Iterable[str]) -> Optional['re.Pattern']:
+    """Single alternation regex for a list of lowercase substrings"""
+    literals = [lit for lit in literals if lit]
+    if not literals:
+        return None
+    # Longest first so the reported hit is the most specific keyword
+    ordered = sorted(set(literals), key=len, reverse=True)
+    return re.compile('|'.join(re.escape(lit) for lit in ordered))
+
+
+class FilterEngine:
+    """Pre-built matchers for game validity and category filtering with per-rule hit counters"""
+
+    def __init__(self, exclude_keywords: Optional[List[str]] = None, categories: Optional[List[str]] = None):
+        """
+        Args:
+            exclude_keywords: Title substrings that mark DLC/add-ons (case-insensitive)
+            categories: Category terms to require; empty or containing "All" matches everything
+        """
+        if exclude_keywords is None:
+            exclude_keywords = DEFAULT_EXCLUDE_KEYWORDS
+        self.exclude_keywords = [kw.lower() for kw in exclude_keywords]
+        self._dev_matcher = _compile_literals(DEV_AUDIENCE_PATTERNS)
+        self._keyword_matcher = _compile_literals(self.exclude_keywords)
+
+        categories = categories or []
+        self.match_all_categories = not categories or "All" in categories
+        self._category_matcher = None if self.match_all_categories else _compile_literals(
+            c.lower() for c in categories
+        )
+        if self._category_matcher is None:
+            self.match_all_categories = True
+
+        self.hits = Counter()
+        self._lock = threading.Lock()
+
+    def _hit(self, rule: str):
+        with self._lock:
+            self.hits[rule] += 1
+
+    def is_valid_game(self, game: Dict) -> bool:
+        """Filter out invalid/unwanted game entries."""
+        title = (game.get("title") or "").lower()
+
+        # Exclude dev/test audiences
+        if self._dev_matcher and self._dev_matcher.search(title):
+            self._hit("dev_audience")
+            return False
+
+        # Exclude DLC/add-ons (look for common patterns)
+        if self._keyword_matcher:
+            match = self._keyword_matcher.search(title)
+            if match:
+                self._hit(f"keyword:{match.group(0)}")
+                return False
+
+        # Must have a valid product slug
+        url_slug = game.get("urlSlug") or game.get("productSlug")
+        if not url_slug or url_slug.strip() == "":
+            self._hit("missing_slug")
+            return False
+
+        # Check if game is actually available (not coming soon)
+        if game.get("status", "") == "COMING_SOON":
+            self._hit("coming_soon")
+            return False
+
+        # Additional check: title should not be empty or suspiciously short
+        if len(title.strip()) < 3:
+            self._hit("short_title")
+            return False
+
+        return True
+
+    def matches_category(self, game: Dict) -> bool:
+        """True if any of the game's category paths contains a configured term"""
+        if self.match_all_categories:
+            return True
+        paths = "\n".join((c.get('path') or '').lower() for c in game.get('categories') or [])
+        if self._category_matcher.search(paths):
+            return True
+        self._hit("category_mismatch")
+        return False
+
+    def reset_counters(self):
+        with self._lock:
+            self.hits.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Snapshot of per-rule hit counters"""
+        with self._lock:
+            return dict(self.hits)
@@ -0,0 +1,110 @@
+"""
+Canonical game record shared by the scraper, notification history, mail and storage
+"""
+import calendar
+import datetime
+import time
+from typing import Dict, Optional
+
+DATE_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
+DISPLAY_FORMAT = "%B %d, %Y at %I:%M %p"  # Example: January 09, 2025 at 04:00 PM
+
+
+def parse_epoch(date_string) -> Optional[float]:
+    """Epoch seconds for an Epic API UTC date string, or None if missing/unparseable"""
+    if not date_string:
+        return None
+    try:
+        return float(calendar.timegm(time.strptime(date_string, DATE_FORMAT)))
+    except (TypeError, ValueError):
+        return None
+
+
+class Game:
+    """A free or discounted game; dates are parsed to epochs once, when the record is created"""
+
+    __slots__ = (
+        'title', 'description', 'original_price', 'discounted_price', 'image_url', 'url',
+        'start_date', 'end_date', 'is_free', 'is_cheap', 'region_prices', 'found_date',
+        'start_ts', 'end_ts', 'extra',
+    )
+
+    # Keys always written to JSON, in the historical order
+    FIELDS = ('title', 'description', 'original_price', 'discounted_price', 'image_url', 'url',
+              'start_date', 'end_date', 'is_free')
+    # Keys only written when set
+    OPTIONAL_FIELDS = ('is_cheap', 'region_prices', 'found_date')
+    _KNOWN = frozenset(FIELDS + OPTIONAL_FIELDS)
+
+    def __init__(self, title, description="No description available.", original_price=None,
+                 discounted_price=None, image_url="", url="", start_date=None, end_date=None,
+                 is_free=False, is_cheap=None, region_prices=None, found_date=None, extra=None):
+        self.title = title
+        self.description = description
+        self.original_price = original_price
+        self.discounted_price = discounted_price
+        self.image_url = image_url
+        self.url = url
+        self.start_date = start_date
+        self.end_date = end_date
+        self.is_free = is_free
+        self.is_cheap = is_cheap
+        self.region_prices = region_prices
+        self.found_date = found_date
+        self.start_ts = parse_epoch(start_date)
+        self.end_ts = parse_epoch(end_date)
+        self.extra = extra  # Unknown keys (e.g. from MongoDB) kept for round-tripping
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'Game':
+        """
+        Build a Game from the stored JSON shape. A Game is returned as is (not
+        copied), so use replace() rather than changing a record you did not create.
+        Raises ValueError for a record without a title.
+        """
+        if isinstance(data, cls):
+            return data
+        if not data.get('title'):
+            raise ValueError(f"Game record without a title: {data!r}")
+        extra = {key: value for key, value in data.items() if key not in cls._KNOWN}
+        return cls(**{key: data[key] for key in cls._KNOWN if key in data}, extra=extra or None)
+
+    def replace(self, **changes) -> 'Game':
+        """Copy with some fields changed; dates are only parsed again if they change"""
+        game = Game.__new__(Game)
+        for slot in self.__slots__:
+            setattr(game, slot, getattr(self, slot))
+        for field, value in changes.items():
+            setattr(game, field, value)
+        if 'start_date' in changes:
+            game.start_ts = parse_epoch(game.start_date)
+        if 'end_date' in changes:
+            game.end_ts = parse_epoch(game.end_date)
+        return game
+
+    def to_dict(self) -> Dict:
+        """Serialize to the stored/emitted JSON shape"""
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        for field in self.OPTIONAL_FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                data[field] = value
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    @property
+    def game_id(self) -> str:
+        """Notification history key"""
+        return f"{self.title}_{self.end_date}"
+
+    @property
+    def end_date_display(self) -> Optional[str]:
+        """Human readable offer end, formatted from the pre-parsed epoch"""
+        if self.end_ts is None:
+            return self.end_date
+        return datetime.datetime.fromtimestamp(self.end_ts, tz=datetime.timezone.utc).strftime(DISPLAY_FORMAT)
+
+    def __repr__(self):
+        return f"Game({self.title!r}, end_date={self.end_date!r})"
+
@@ -0,0 +1,188 @@
+"""
+Shared pooled HTTP session for all outbound Epic Games Store calls
+"""
+import logging
+import random
+import threading
+from typing import Dict
+
+import cloudscraper
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Defaults, overridable through configure()
+POOL_SIZE = 10
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 15
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+BACKOFF_JITTER = 0.5  # Fraction of each backoff randomised either way
+KEEP_ALIVE = True
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_session = None
+_store_session = None
+
+
+class JitteredRetry(Retry):
+    """urllib3 Retry with exponential backoff spread by BACKOFF_JITTER"""
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        if backoff and BACKOFF_JITTER:
+            backoff *= random.uniform(1 - BACKOFF_JITTER, 1 + BACKOFF_JITTER)
+        return backoff
+
+
+def _build_retry() -> Retry:
+    """Retry policy for 429/5xx responses"""
+    return JitteredRetry(
+        total=MAX_RETRIES,
+        status_forcelist=RETRY_STATUSES,
+        backoff_factor=BACKOFF_FACTOR,
+        # The store GraphQL endpoint is read-only, so POST is safe to retry
+        allowed_methods=frozenset({'HEAD', 'GET', 'POST', 'OPTIONS'}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class DefaultTimeoutAdapter(HTTPAdapter):
+    """HTTPAdapter that sends requests made without a timeout with default_timeout()"""
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if timeout is None:
+            timeout = default_timeout()
+        return super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+
+
+_timeout_adapter_classes: Dict[type, type] = {}
+
+
+def _with_default_timeout(adapter: HTTPAdapter) -> HTTPAdapter:
+    """
+    Give an adapter DefaultTimeoutAdapter's send() on top of its own class,
+    so subclasses such as cloudscraper's TLS adapter keep their behaviour
+    """
+    base = type(adapter)
+    if not issubclass(base, DefaultTimeoutAdapter):
+        cls = _timeout_adapter_classes.get(base)
+        if cls is None:
+            cls = _timeout_adapter_classes[base] = type(f"DefaultTimeout{base.__name__}", (DefaultTimeoutAdapter, base), {})
+        adapter.__class__ = cls
+    return adapter
+
+
+def _prepare(session: requests.Session) -> requests.Session:
+    """Apply pool size, retry, keep-alive and default timeout policy to a session"""
+    retry = _build_retry()
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        # Reconfigured in place so adapter subclasses (cloudscraper's TLS adapter) keep working
+        adapter.max_retries = retry
+        adapter.init_poolmanager(POOL_SIZE, POOL_SIZE)
+        # Every request reaches an adapter, including the POSTs EpicGamesStoreAPI
+        # makes itself, so none of them can wait on a stalled connection forever
+        _with_default_timeout(adapter)
+    if not KEEP_ALIVE:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def configure(pool_size=None, connect_timeout=None, read_timeout=None,
+              max_retries=None, backoff_factor=None, keep_alive=None):
+    """Update pool/timeout/retry settings; sessions are rebuilt on next use"""
+    global POOL_SIZE, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES, BACKOFF_FACTOR, KEEP_ALIVE
+    global _session, _store_session
+    with _lock:
+        previous = (POOL_SIZE, MAX_RETRIES, BACKOFF_FACTOR, KEEP_ALIVE)
+        if pool_size is not None:
+            POOL_SIZE = max(1, int(pool_size))
+        if connect_timeout is not None:
+            CONNECT_TIMEOUT = float(connect_timeout)
+        if read_timeout is not None:
+            READ_TIMEOUT = float(read_timeout)
+        if max_retries is not None:
+            MAX_RETRIES = max(0, int(max_retries))
+        if backoff_factor is not None:
+            BACKOFF_FACTOR = float(backoff_factor)
+        if keep_alive is not None:
+            KEEP_ALIVE = bool(keep_alive)
+        # Timeouts are applied per request, everything else needs new adapters
+        if previous != (POOL_SIZE, MAX_RETRIES, BACKOFF_FACTOR, KEEP_ALIVE):
+            for old_session in (_session, _store_session):
+                if old_session is not None:
+                    old_session.close()
+            _session = None
+            _store_session = None
+
+
+def get_session() -> requests.Session:
+    """Return the shared pooled session"""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _prepare(requests.Session())
+        return _session
+
+
+def get_store_session() -> requests.Session:
+    """Return the shared cloudscraper session used by EpicGamesStoreAPI"""
+    global _store_session
+    with _lock:
+        if _store_session is None:
+            _store_session = _prepare(cloudscraper.create_scraper())
+        return _store_session
+
+
+def default_timeout():
+    """(connect, read) timeout tuple applied when callers pass none"""
+    return (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+
+def request(method: str, url: str, **kwargs) -> requests.Response:
+    """Send a request through the shared session (default_timeout() unless one is given)"""
+    return get_session().request(method, url, **kwargs)
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request('GET', url, **kwargs)
+
+
+def head(url: str, **kwargs) -> requests.Response:
+    return request('HEAD', url, **kwargs)
+
+
+def connection_stats() -> Dict[str, int]:
+    """Requests sent vs. connections opened across both sessions"""
+    stats = {'requests': 0, 'connections': 0}
+    with _lock:
+        sessions = [s for s in (_session, _store_session) if s is not None]
+    for session in sessions:
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                stats['requests'] += pool.num_requests
+                stats['connections'] += pool.num_connections
+    stats['reused'] = max(0, stats['requests'] - stats['connections'])
+    return stats
+
+
+def log_connection_stats():
+    """Log how many requests reused a pooled connection"""
+    stats = connection_stats()
+    logging.info(
+        f"HTTP pool: {stats['requests']} requests over {stats['connections']} connections "
+        f"({stats['reused']} reused)"
+    )
+    return stats
@@ -0,0 +1,178 @@
+"""
+Parallel SMTP delivery over a pool of authenticated connections
+"""
+import logging
+import queue
+import smtplib
+import threading
+import time
+from collections import namedtuple
+from email.message import Message
+from typing import List, Optional
+
+DeliveryResult = namedtuple('DeliveryResult', ['recipient', 'success', 'attempts', 'error'])
+
+
+class SmtpDeliveryEngine:
+    """Sends one message to many recipients over N worker connections"""
+
+    def __init__(self, host: str, port: int, username: Optional[str] = None, password: Optional[str] = None,
+                 workers: int = 4, rate_limit: float = 0, use_starttls: bool = True,
+                 timeout: float = 30, max_attempts: int = 2, smtp_factory=smtplib.SMTP):
+        """
+        Args:
+            host, port: SMTP server address
+            username, password: Login credentials; login is skipped without a username
+            workers: Number of parallel connections, each logging in once
+            rate_limit: Maximum messages per second across all workers (0 = unlimited)
+            use_starttls: Upgrade each connection with STARTTLS before login
+            timeout: Socket timeout per connection
+            max_attempts: Tries per recipient; a dropped connection is reopened between tries
+            smtp_factory: Callable returning an smtplib.SMTP-like client
+        """
+        self.host = host
+        self.port = int(port)
+        self.username = username
+        self.password = password
+        self.workers = max(1, int(workers))
+        self.rate_limit = float(rate_limit or 0)
+        self.use_starttls = use_starttls
+        self.timeout = timeout
+        self.max_attempts = max(1, int(max_attempts))
+        self.smtp_factory = smtp_factory
+
+        self._rate_lock = threading.Lock()
+        self._next_slot = 0.0
+        self._abort_error = None
+
+    def _connect(self):
+        """Open, secure and authenticate one connection"""
+        server = self.smtp_factory(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_starttls:
+                server.starttls()
+            if self.username:
+                server.login(self.username, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        return server
+
+    @staticmethod
+    def _close(server):
+        if server is None:
+            return
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _throttle(self):
+        """Block until this worker may send under the shared messages-per-second cap"""
+        if not self.rate_limit:
+            return
+        with self._rate_lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1.0 / self.rate_limit
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _send_one(self, server, from_addr: str, recipient: str, payload: bytes):
+        # The serialized message has no To header, so it is added per recipient
+        server.sendmail(from_addr, [recipient], b"To: " + recipient.encode('utf-8') + b"\r\n" + payload)
+
+    def _record(self, results: list, index: int, result: DeliveryResult, on_result):
+        results[index] = result
+        if on_result:
+            on_result(result)
+
+    def _worker(self, from_addr: str, payload: bytes, jobs: queue.Queue, results: list, on_result=None):
+        server = None
+        try:
+            while self._abort_error is None:
+                try:
+                    index, recipient = jobs.get_nowait()
+                except queue.Empty:
+                    return
+
+                attempts = 0
+                error = None
+                while attempts < self.max_attempts:
+                    attempts += 1
+                    try:
+                        if server is None:
+                            server = self._connect()
+                        self._throttle()
+                        self._send_one(server, from_addr, recipient, payload)
+                        error = None
+                        break
+                    except smtplib.SMTPAuthenticationError as e:
+                        # Bad credentials fail every recipient, so stop all workers
+                        error = f"Authentication failed: {e}"
+                        self._abort_error = error
+                        break
+                    except smtplib.SMTPRecipientsRefused as e:
+                        error = f"Recipient refused: {e.recipients.get(recipient, e)}"
+                        break
+                    except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError) as e:
+                        # Dropped connection: reconnect and retry this recipient
+                        error = f"Connection error: {e}"
+                        self._close(server)
+                        server = None
+                    except smtplib.SMTPException as e:
+                        # Any other SMTP reply (e.g. 550) is permanent; SMTPException subclasses
+                        # OSError, so this has to come before the socket error branch
+                        error = str(e)
+                        break
+                    except OSError as e:
+                        # Socket error: reconnect and retry this recipient
+                        error = f"Connection error: {e}"
+                        self._close(server)
+                        server = None
+
+                self._record(results, index, DeliveryResult(recipient, error is None, attempts, error), on_result)
+        finally:
+            self._close(server)
+
+    def deliver(self, from_addr: str, msg: Message, recipients: List[str], on_result=None) -> List[DeliveryResult]:
+        """
+        Send msg to every recipient and return one DeliveryResult per recipient, in order.
+        on_result(result) is called from the worker threads as each recipient completes.
+        """
+        results: list = [None] * len(recipients)
+        jobs = queue.Queue()
+        for index, recipient in enumerate(recipients):
+            if '\r' in recipient or '\n' in recipient:
+                self._record(results, index, DeliveryResult(recipient, False, 0, "Invalid recipient address"), on_result)
+                continue
+            jobs.put((index, recipient))
+
+        if jobs.empty():
+            return results
+
+        del msg['To']
+        payload = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+
+        self._abort_error = None
+        worker_count = min(self.workers, jobs.qsize())
+        threads = [
+            threading.Thread(target=self._worker, args=(from_addr, payload, jobs, results, on_result), daemon=True)
+            for _ in range(worker_count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Anything left unsent was abandoned after an authentication failure
+        for index, recipient in enumerate(recipients):
+            if results[index] is None:
+                self._record(results, index, DeliveryResult(recipient, False, 0, self._abort_error or "Not sent"), on_result)
+
+        delivered = sum(1 for r in results if r.success)
+        logging.info(f"SMTP delivery: {delivered}/{len(recipients)} delivered over {worker_count} connection(s)")
+        return results
@@ -0,0 +1,191 @@
+"""
+Indexed notification history - O(1) lookups and append-only writes
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from game import parse_epoch
+
+RETENTION_DAYS = 30
+UNDATED_RETENTION_DAYS = 30  # Ids without an end date (e.g. "title_None") expire this long after first seen
+MAX_ENTRIES = 5000
+
+
+def expiry_for(game_id: str, end_ts: Optional[float] = None) -> Optional[float]:
+    """
+    Epoch after which a notification id stops counting as notified.
+    Ids look like "title_end_date"; an entry expires once its end date is
+    more than RETENTION_DAYS whole days old. end_ts is the already parsed end
+    date, if the caller has it. Returns None for unparseable dates.
+    """
+    if end_ts is None:
+        end_ts = parse_epoch(game_id.split('_')[-1])
+        if end_ts is None:
+            return None
+    return end_ts + (RETENTION_DAYS + 1) * 86400
+
+
+class NotificationHistory:
+    """Dict of game id -> (expiry, first seen) epochs backed by a JSON-lines journal"""
+
+    def __init__(self, path: str, legacy_path: Optional[str] = None,
+                 undated_retention_days: float = UNDATED_RETENTION_DAYS, max_entries: int = MAX_ENTRIES):
+        """
+        Args:
+            path: JSON-lines store, one {"id", "expires_at", "first_seen"} record per line
+            legacy_path: {"notified_games": [...]} file imported when the store does not exist yet
+            undated_retention_days: Lifetime of ids without a parseable end date
+            max_entries: Compaction keeps at most this many of the newest entries
+        """
+        self.path = path
+        self.legacy_path = legacy_path
+        self.undated_retention_days = undated_retention_days
+        self.max_entries = max_entries
+        self.entries: Dict[str, Tuple[Optional[float], float]] = {}
+        self._records = 0  # Lines in the file, including superseded ones
+        self._offset = 0
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            self._migrate_legacy()
+
+    def _migrate_legacy(self):
+        ids = []
+        if self.legacy_path and os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, 'r') as f:
+                    ids = json.load(f).get('notified_games', [])
+                logging.info(f"Migrating {len(ids)} entries from {self.legacy_path} to {self.path}")
+            except Exception as e:
+                logging.error(f"Could not read legacy notification history: {e}")
+        with open(self.path, 'a'):
+            pass
+        self._append(ids)
+
+    def _refresh(self):
+        """Pick up records appended since the last read (by us or another process)"""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        if size < self._offset:
+            # The file was rewritten, start over
+            self.entries = {}
+            self._records = 0
+            self._offset = 0
+        if size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partially written record, read it next time
+                self._offset += len(line)
+                self._records += 1
+                try:
+                    record = json.loads(line)
+                    # Records from before retention tracking count as first seen now
+                    self.entries[record['id']] = (record.get('expires_at'), record.get('first_seen') or time.time())
+                except (ValueError, KeyError):
+                    logging.warning(f"Skipping unreadable notification record in {self.path}")
+
+    def _record(self, game_id: str, now: float, end_ts: Optional[float] = None) -> Dict:
+        return {'id': game_id, 'expires_at': expiry_for(game_id, end_ts), 'first_seen': now}
+
+    def _expires_at(self, entry: Tuple[Optional[float], float]) -> float:
+        expires_at, first_seen = entry
+        if expires_at is None:
+            return first_seen + self.undated_retention_days * 86400
+        return expires_at
+
+    def _append(self, game_ids: Iterable[str], end_ts: Optional[Dict[str, Optional[float]]] = None):
+        now = time.time()
+        end_ts = end_ts or {}
+        lines = [json.dumps(self._record(game_id, now, end_ts.get(game_id))) + "\n" for game_id in game_ids]
+        if not lines:
+            return
+        with open(self.path, 'a') as f:
+            f.writelines(lines)
+            f.flush()
+
+    def refresh(self):
+        """Load records written since the last refresh"""
+        with self._lock:
+            self._refresh()
+
+    def is_notified(self, game_id: str, now: Optional[float] = None) -> bool:
+        """True if game_id was notified and has not expired (as of the last refresh)"""
+        now = now if now is not None else datetime.datetime.now().timestamp()
+        with self._lock:
+            if game_id not in self.entries:
+                return False
+            return now < self._expires_at(self.entries[game_id])
+
+    def add(self, game_ids: Iterable[str], now: Optional[float] = None,
+            end_ts: Optional[Dict[str, Optional[float]]] = None):
+        """
+        Record newly notified ids; only new ids and re-notified undated ids are written.
+        end_ts optionally maps ids to their pre-parsed end epochs to skip re-parsing dates.
+        """
+        now = now if now is not None else datetime.datetime.now().timestamp()
+        with self._lock:
+            self._refresh()
+            self._append(
+                [
+                    game_id for game_id in dict.fromkeys(game_ids)
+                    if game_id not in self.entries
+                    # An undated id that expired restarts its retention from now
+                    or (self.entries[game_id][0] is None and now >= self._expires_at(self.entries[game_id]))
+                ],
+                end_ts,
+            )
+            self._refresh()
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """
+        Drop expired entries (dated and undated), superseded records and the
+        oldest entries beyond max_entries, rewriting the file atomically.
+        Returns the number of records dropped.
+        """
+        now = now if now is not None else datetime.datetime.now().timestamp()
+        with self._lock:
+            self._refresh()
+            live = [(game_id, entry) for game_id, entry in self.entries.items() if now < self._expires_at(entry)]
+            if len(live) > self.max_entries:
+                live.sort(key=lambda item: item[1][1])
+                live = live[-self.max_entries:]
+            dropped = self._records - len(live)
+            if dropped <= 0:
+                return 0
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                for game_id, (expires_at, first_seen) in live:
+                    f.write(json.dumps({'id': game_id, 'expires_at': expires_at, 'first_seen': first_seen}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+            self.entries = dict(live)
+            self._records = len(live)
+            self._offset = os.path.getsize(self.path)
+            logging.info(f"Compacted {self.path}: dropped {dropped} record(s), kept {len(live)}")
+            return dropped
+
+
+_stores: Dict[str, NotificationHistory] = {}
+_stores_lock = threading.Lock()
+
+
+def get_notification_history(history_file: str, undated_retention_days: float = UNDATED_RETENTION_DAYS,
+                             max_entries: int = MAX_ENTRIES) -> NotificationHistory:
+    """Shared store for a history file; "x.json" is kept in "x.jsonl" and migrated on first use"""
+    store_path = os.path.splitext(history_file)[0] + '.jsonl'
+    with _stores_lock:
+        store = _stores.get(store_path)
+        if store is None:
+            store = _stores[store_path] = NotificationHistory(store_path, legacy_path=history_file)
+        store.undated_retention_days = undated_retention_days
+        store.max_entries = max_entries
+        return store
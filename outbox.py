@@ -0,0 +1,217 @@
+"""
+Durable on-disk outbox of pending notification emails
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from game import Game
+
+# File locking (POSIX only; on Windows a single drainer per outbox is assumed)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+PENDING = 'pending'
+DONE = 'done'
+DEAD = 'dead'
+CLAIM_LEASE = 900  # Seconds a drainer owns the jobs it took before another one may retry them
+
+
+def digest_id_for(games: List) -> str:
+    """Stable id for a set of games (Game records or dicts), so the same digest is never queued twice"""
+    game_ids = sorted(Game.from_dict(g).game_id for g in games)
+    return hashlib.sha1("\n".join(game_ids).encode('utf-8')).hexdigest()[:16]
+
+
+class Outbox:
+    """
+    Append-only JSON-lines journal of (recipient, digest) jobs.
+
+    Every state change is appended and fsynced before it is acknowledged, so
+    replaying the journal after a crash resumes exactly where delivery stopped.
+    Several processes may share one journal (the app enqueues while
+    `--drain` sends): every operation holds an exclusive lock on
+    "<path>.lock" and first catches up with what the others wrote, and
+    due_jobs() claims the jobs it returns so no two drainers send the same one.
+    """
+
+    def __init__(self, path='outbox.jsonl', max_attempts=5, retry_backoff=60, claim_lease=CLAIM_LEASE):
+        """
+        Args:
+            path: Journal file
+            max_attempts: Failed sends per job before it is given up
+            retry_backoff: Base seconds before a failed job is retried (doubles per attempt)
+            claim_lease: Seconds before a claimed job that was never marked done or failed is due again
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.claim_lease = claim_lease
+        self.jobs: Dict[str, Dict] = {}
+        self.digests: Dict[str, List[Dict]] = {}
+        self._offset = 0     # Bytes of the journal already applied
+        self._inode = None   # Compaction replaces the file, which means replaying it from the start
+        self._lock = threading.Lock()
+        with self._locked():
+            pass  # Replays the journal
+
+    def _apply(self, record: Dict):
+        op = record.get('op')
+        if op == 'digest':
+            self.digests[record['id']] = record['games']
+        elif op == 'enqueue':
+            self.jobs[record['id']] = {
+                'id': record['id'],
+                'digest': record['digest'],
+                'recipient': record['recipient'],
+                'status': PENDING,
+                'attempts': 0,
+                'next_attempt_at': 0,
+                'error': None,
+            }
+        elif op in ('done', 'fail', 'claim') and record['id'] in self.jobs:
+            job = self.jobs[record['id']]
+            if op == 'done':
+                job['status'] = DONE
+            elif op == 'claim':
+                job['next_attempt_at'] = record['until']
+            else:
+                job['attempts'] = record['attempts']
+                job['error'] = record.get('error')
+                job['next_attempt_at'] = record.get('next_attempt_at', 0)
+                job['status'] = DEAD if record['attempts'] >= self.max_attempts else PENDING
+
+    @contextmanager
+    def _locked(self):
+        """Hold the thread and file locks, with the in-memory state caught up with the journal"""
+        with self._lock, open(f"{self.path}.lock", 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                self._load()
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        """Apply the records appended since the last load, replaying the journal if it was replaced"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        if stat is None or stat.st_ino != self._inode or stat.st_size < self._offset:
+            self.jobs, self.digests, self._offset = {}, {}, 0
+            self._inode = stat.st_ino if stat else None
+        if stat is None or stat.st_size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                self._offset += len(line)
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError):
+                    # A torn last line from a crash mid-write is simply dropped
+                    logging.warning(f"Skipping unreadable outbox record in {self.path}")
+
+    def _append(self, records: List[Dict]):
+        # Called inside _locked(), so the file ends where the last load stopped
+        with open(self.path, 'ab') as f:
+            for record in records:
+                f.write((json.dumps(record) + "\n").encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            self._offset = f.tell()
+            self._inode = os.fstat(f.fileno()).st_ino
+        for record in records:
+            self._apply(record)
+
+    def enqueue(self, games: List, recipients: List[str]) -> str:
+        """Queue one digest of games for every recipient; returns the digest id"""
+        digest_id = digest_id_for(games)
+        with self._locked():
+            records = []
+            if digest_id not in self.digests:
+                records.append({'op': 'digest', 'id': digest_id, 'games': [Game.from_dict(g).to_dict() for g in games]})
+            for recipient in recipients:
+                job_id = f"{digest_id}:{recipient}"
+                if job_id not in self.jobs:
+                    records.append({'op': 'enqueue', 'id': job_id, 'digest': digest_id, 'recipient': recipient})
+            if records:
+                self._append(records)
+        return digest_id
+
+    def due_jobs(self, now: Optional[float] = None) -> List[Dict]:
+        """
+        Pending jobs whose retry time has come, claimed for claim_lease seconds:
+        the caller must mark each one done or failed.
+        """
+        now = now if now is not None else time.time()
+        with self._locked():
+            due = [dict(job) for job in self.jobs.values()
+                   if job['status'] == PENDING and job['next_attempt_at'] <= now]
+            if due:
+                self._append([{'op': 'claim', 'id': job['id'], 'until': now + self.claim_lease} for job in due])
+            return due
+
+    def next_due_at(self) -> Optional[float]:
+        """Earliest retry time among pending jobs, or None if nothing is pending"""
+        with self._locked():
+            times = [job['next_attempt_at'] for job in self.jobs.values() if job['status'] == PENDING]
+        return min(times) if times else None
+
+    def mark_done(self, job_id: str):
+        with self._locked():
+            self._append([{'op': 'done', 'id': job_id, 'at': time.time()}])
+
+    def mark_failed(self, job_id: str, error: str):
+        with self._locked():
+            attempts = self.jobs[job_id]['attempts'] + 1
+            next_attempt_at = time.time() + self.retry_backoff * (2 ** (attempts - 1))
+            self._append([{'op': 'fail', 'id': job_id, 'attempts': attempts,
+                           'error': error, 'next_attempt_at': next_attempt_at}])
+            if attempts >= self.max_attempts:
+                logging.error(f"Giving up on {self.jobs[job_id]['recipient']} after {attempts} attempts: {error}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._locked():
+            stats = {PENDING: 0, DONE: 0, DEAD: 0}
+            for job in self.jobs.values():
+                stats[job['status']] += 1
+            return stats
+
+    def compact(self):
+        """Atomically rewrite the journal keeping only pending jobs and their digests"""
+        with self._locked():
+            pending = [job for job in self.jobs.values() if job['status'] == PENDING]
+            digest_ids = {job['digest'] for job in pending}
+            records = [{'op': 'digest', 'id': d, 'games': self.digests[d]} for d in digest_ids]
+            for job in pending:
+                records.append({'op': 'enqueue', 'id': job['id'], 'digest': job['digest'], 'recipient': job['recipient']})
+                if job['attempts'] or job['next_attempt_at']:
+                    # Keeps retry times and live claims as well as attempt counts
+                    records.append({'op': 'fail', 'id': job['id'], 'attempts': job['attempts'],
+                                    'error': job['error'], 'next_attempt_at': job['next_attempt_at']})
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+            self.jobs = {}
+            self.digests = {}
+            for record in records:
+                self._apply(record)
+            stat = os.stat(self.path)
+            self._offset, self._inode = stat.st_size, stat.st_ino
@@ -0,0 +1,74 @@
+"""
+Composable generator pipeline with per-stage item and timing counters
+"""
+import time
+from typing import Callable, Dict, Iterable, Iterator, List
+
+
+class PipelineStage:
+    """One step of a streaming pipeline; transform maps an iterable of items to an iterable"""
+
+    def __init__(self, name: str, transform: Callable[[Iterable], Iterable]):
+        self.name = name
+        self.transform = transform
+        self.items_in = 0
+        self.items_out = 0
+        self.elapsed = 0.0  # Seconds spent in this stage, excluding upstream stages
+        self._upstream_time = 0.0
+
+    def _pull(self, upstream: Iterable) -> Iterator:
+        """Feed upstream items to the transform, timing how long upstream takes"""
+        iterator = iter(upstream)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._upstream_time += time.perf_counter() - start
+                return
+            self._upstream_time += time.perf_counter() - start
+            self.items_in += 1
+            yield item
+
+    def __call__(self, upstream: Iterable) -> Iterator:
+        output = iter(self.transform(self._pull(upstream)))
+        total = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(output)
+                except StopIteration:
+                    total += time.perf_counter() - start
+                    return
+                total += time.perf_counter() - start
+                self.items_out += 1
+                yield item
+        finally:
+            self.elapsed = max(0.0, total - self._upstream_time)
+
+    def stats(self) -> Dict:
+        return {
+            'stage': self.name,
+            'items_in': self.items_in,
+            'items_out': self.items_out,
+            'seconds': round(self.elapsed, 4),
+        }
+
+
+def filter_stage(name: str, predicate: Callable) -> PipelineStage:
+    """Stage that keeps items for which predicate is true"""
+    return PipelineStage(name, lambda items: (item for item in items if predicate(item)))
+
+
+def map_stage(name: str, func: Callable) -> PipelineStage:
+    """Stage that transforms items one by one, dropping None results"""
+    return PipelineStage(name, lambda items: (out for out in map(func, items) if out is not None))
+
+
+def run_pipeline(source: Iterable, stages: List[PipelineStage]) -> Iterator:
+    """Chain stages onto source and return the final iterator"""
+    items = source
+    for stage in stages:
+        items = stage(items)
+    return items
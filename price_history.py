@@ -0,0 +1,307 @@
+"""
+Append-only price time series per store product with O(1) lowest/highest/last lookups
+"""
+import json
+import logging
+import os
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PRICE_HISTORY_FILE = 'price_history.jsonl'
+HEARTBEAT = 7 * 86400  # An unchanged price is still recorded this often, so the series shows it was seen
+RETENTION_DAYS = 365   # Points older than this are compacted away, except each series' lowest and highest
+
+
+def element_slug(game: Dict) -> Optional[str]:
+    """
+    Product slug of a store element: urlSlug, else productSlug, as for deep
+    search store URLs and the URL validation cache, so a product has one
+    series whether it was seen in the promotions feed or the catalog
+    """
+    return game.get('urlSlug') or game.get('productSlug')
+
+
+def series_key(country: str, slug: str) -> str:
+    """Prices are only comparable within one region (and currency)"""
+    return f"{country}:{slug}"
+
+
+class PriceSeries:
+    """Columnar (timestamp, price, original price) points of one product plus running aggregates"""
+
+    __slots__ = ('timestamps', 'prices', 'originals', 'title', 'currency',
+                 'min_price', 'min_at', 'max_price', 'max_at')
+
+    def __init__(self):
+        self.timestamps = array('d')
+        self.prices = array('q')     # Minor units, e.g. 1999 for 19.99
+        self.originals = array('q')  # -1 when unknown
+        self.title = None
+        self.currency = None
+        self.min_price = None
+        self.min_at = None
+        self.max_price = None
+        self.max_at = None
+
+    def point(self, index: int) -> Tuple[float, int, Optional[int]]:
+        original = self.originals[index]
+        return self.timestamps[index], self.prices[index], None if original < 0 else original
+
+    def append(self, timestamp: float, price: int, original: Optional[int]):
+        self.timestamps.append(timestamp)
+        self.prices.append(price)
+        self.originals.append(-1 if original is None else original)
+        if self.min_price is None or price < self.min_price:
+            self.min_price, self.min_at = price, timestamp
+        if self.max_price is None or price > self.max_price:
+            self.max_price, self.max_at = price, timestamp
+
+    @property
+    def last_price(self) -> int:
+        return self.prices[-1]
+
+    @property
+    def last_at(self) -> float:
+        return self.timestamps[-1]
+
+    def summary(self) -> Dict:
+        original = self.originals[-1]
+        return {
+            'title': self.title,
+            'currency': self.currency,
+            'lowest': self.min_price,
+            'lowest_at': self.min_at,
+            'highest': self.max_price,
+            'highest_at': self.max_at,
+            'last': self.last_price,
+            'last_at': self.last_at,
+            'original': None if original < 0 else original,
+            'first_at': self.timestamps[0],
+            'points': len(self.prices),
+        }
+
+    def points(self, since: Optional[float] = None) -> List[List]:
+        return [
+            [timestamp, price, None if original < 0 else original]
+            for timestamp, price, original in zip(self.timestamps, self.prices, self.originals)
+            if since is None or timestamp >= since
+        ]
+
+
+class PriceHistory:
+    """
+    Per-product price series backed by a JSON-lines journal.
+
+    A point is only appended when a product's price (or original price)
+    differs from its last point, or HEARTBEAT seconds have passed since it.
+    Scrapes buffer their points with record() and write them in one append
+    with flush(); other processes pick the new lines up on their next query.
+    compact() drops points past the retention period.
+    """
+
+    def __init__(self, path: str = PRICE_HISTORY_FILE, heartbeat: float = HEARTBEAT,
+                 retention_days: float = RETENTION_DAYS):
+        """
+        Args:
+            path: JSON-lines store, one {"k", "t", "p", "o"} point per line, plus
+                  "n" (title) and "c" (currency) whenever they change
+            heartbeat: Seconds after which an unchanged price is recorded again
+            retention_days: Age after which compaction drops points (but not a series' lowest and highest)
+        """
+        self.path = path
+        self.heartbeat = heartbeat
+        self.retention_days = retention_days
+        self.series: Dict[str, PriceSeries] = {}
+        self.by_slug: Dict[str, Dict[str, PriceSeries]] = {}  # slug -> region -> series
+        self._pending: List[Dict] = []
+        self._pending_last: Dict[str, Dict] = {}  # key -> newest buffered record
+        self._records = 0  # Lines in the file, including heartbeats compaction may drop
+        self._offset = 0
+        self._inode = None
+        self._lock = threading.Lock()
+
+    def _reset(self):
+        self.series = {}
+        self.by_slug = {}
+        self._records = 0
+        self._offset = 0
+
+    def _apply(self, record: Dict):
+        series = self.series.get(record['k'])
+        if series is None:
+            series = self.series[record['k']] = PriceSeries()
+            region, _, slug = record['k'].partition(':')
+            self.by_slug.setdefault(slug, {})[region] = series
+        if 'n' in record:
+            series.title = record['n']
+        if 'c' in record:
+            series.currency = record['c']
+        series.append(float(record['t']), int(record['p']), record.get('o'))
+
+    def _refresh(self):
+        """Pick up points appended since the last read (by us or another process)"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            stat = None
+        size = stat.st_size if stat else 0
+        inode = stat.st_ino if stat else None
+        if size < self._offset or inode != self._inode:
+            # The file was replaced (e.g. compacted by another process), start over
+            self._reset()
+            self._inode = inode
+        if size == self._offset:
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Partially written point, read it next time
+                self._offset += len(line)
+                self._records += 1
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError, TypeError):
+                    logging.warning(f"Skipping unreadable price point in {self.path}")
+
+    def record(self, key: str, price: int, original: Optional[int] = None, title: Optional[str] = None,
+               currency: Optional[str] = None, now: Optional[float] = None) -> bool:
+        """Buffer a price observation; returns True if it adds a point to the series"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            if not self._pending:
+                self._refresh()
+            last = self._pending_last.get(key)
+            series = self.series.get(key)
+            if last is None and series is not None:
+                original_last = series.originals[-1]
+                last = {'t': series.last_at, 'p': series.last_price,
+                        'o': None if original_last < 0 else original_last,
+                        'n': series.title, 'c': series.currency}
+            if last is not None and last['p'] == price and last['o'] == original and now - last['t'] < self.heartbeat:
+                return False
+
+            record = {'k': key, 't': round(now, 3), 'p': price, 'o': original}
+            if title and (last is None or last.get('n') != title):
+                record['n'] = title
+            if currency and (last is None or last.get('c') != currency):
+                record['c'] = currency
+            self._pending.append(record)
+            self._pending_last[key] = {'t': now, 'p': price, 'o': original,
+                                       'n': title or (last or {}).get('n'), 'c': currency or (last or {}).get('c')}
+            return True
+
+    def record_elements(self, country: str, elements: Iterable[Dict], now: Optional[float] = None) -> int:
+        """Buffer the current price of every store catalog element; returns how many points were added"""
+        added = 0
+        for game in elements:
+            total_price = (game.get('price') or {}).get('totalPrice') or {}
+            price = total_price.get('discountPrice')
+            slug = element_slug(game)
+            if price is None or not slug:
+                continue
+            added += self.record(
+                series_key(country, slug), int(price), total_price.get('originalPrice'),
+                title=game.get('title'), currency=total_price.get('currencyCode'), now=now,
+            )
+        return added
+
+    def flush(self) -> int:
+        """Append the buffered points in one write; returns how many were written"""
+        with self._lock:
+            records, self._pending, self._pending_last = self._pending, [], {}
+            if not records:
+                return 0
+            try:
+                with open(self.path, 'a') as f:
+                    f.writelines(json.dumps(record, separators=(',', ':')) + "\n" for record in records)
+                    f.flush()
+            except Exception as e:
+                logging.error(f"Failed to write price history: {e}")
+                return 0
+            self._refresh()
+            return len(records)
+
+    def stats(self, key: str) -> Optional[Dict]:
+        """Lowest, highest and last price of one series, or None if it was never seen"""
+        with self._lock:
+            self._refresh()
+            series = self.series.get(key)
+            return series.summary() if series else None
+
+    def products(self, country: Optional[str] = None) -> Dict[str, Dict]:
+        """Summaries of every series, optionally limited to one region"""
+        with self._lock:
+            self._refresh()
+            prefix = f"{country}:" if country else ''
+            return {key: series.summary() for key, series in self.series.items() if key.startswith(prefix)}
+
+    def history(self, slug: str, country: Optional[str] = None, since: Optional[float] = None) -> Dict[str, Dict]:
+        """Summary and points of a product in every region it was seen in (or just `country`)"""
+        with self._lock:
+            self._refresh()
+            return {
+                region: dict(series.summary(), history=series.points(since))
+                for region, series in self.by_slug.get(slug, {}).items()
+                if country is None or region == country
+            }
+
+    def compact(self, now: Optional[float] = None) -> int:
+        """
+        Drop points older than retention_days, keeping each series' lowest and
+        highest point so the all-time aggregates survive, and series not seen
+        within the retention period altogether. Rewrites the file atomically.
+        Returns the number of records dropped.
+        """
+        now = now if now is not None else time.time()
+        cutoff = now - self.retention_days * 86400
+        with self._lock:
+            self._refresh()
+            records = []
+            for key, series in self.series.items():
+                if series.last_at < cutoff:
+                    continue
+                keep = [i for i, timestamp in enumerate(series.timestamps) if timestamp >= cutoff]
+                lowest = series.prices.index(series.min_price)
+                highest = series.prices.index(series.max_price)
+                for position, index in enumerate(sorted(set(keep) | {lowest, highest})):
+                    timestamp, price, original = series.point(index)
+                    record = {'k': key, 't': timestamp, 'p': price, 'o': original}
+                    if position == 0:
+                        # Title and currency are only written when they change, so restate them
+                        record.update({'n': series.title, 'c': series.currency})
+                    records.append(record)
+            dropped = self._records - len(records)
+            if dropped <= 0:
+                return 0
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.writelines(json.dumps(record, separators=(',', ':')) + "\n" for record in records)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+            self._reset()
+            for record in records:
+                self._apply(record)
+            stat = os.stat(self.path)
+            self._records, self._offset, self._inode = len(records), stat.st_size, stat.st_ino
+            logging.info(f"Compacted {self.path}: dropped {dropped} record(s), kept {len(records)}")
+            return dropped
+
+
+_stores: Dict[str, PriceHistory] = {}
+_stores_lock = threading.Lock()
+
+
+def get_price_history(path: str = PRICE_HISTORY_FILE) -> PriceHistory:
+    """Shared store for a price history file, keyed by absolute path"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = PriceHistory(key)
+        return store
@@ -0,0 +1,128 @@
+"""
+Opt-in CPU (cProfile) and memory (tracemalloc) profiling of scraper runs
+"""
+import cProfile
+import glob
+import io
+import logging
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+PROFILE_ENV = 'NOTIFIER_PROFILE'  # Set to 1/true/yes to profile every run
+PROFILE_DIR = os.getenv('NOTIFIER_PROFILE_DIR', 'profiles')
+PROFILE_KEEP = int(os.getenv('NOTIFIER_PROFILE_KEEP', '20'))  # Runs kept in PROFILE_DIR
+TOP_FUNCTIONS = 15
+TOP_ALLOCATIONS = 15
+SUMMARY_LINES = 5  # Entries of each kind echoed to the run's log stream
+TRACEMALLOC_FRAMES = 10
+
+
+def profiling_enabled(flag: Optional[bool] = None) -> bool:
+    """An explicit flag wins, otherwise the NOTIFIER_PROFILE environment variable decides"""
+    if flag is not None:
+        return bool(flag)
+    return os.getenv(PROFILE_ENV, '').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _rotate(directory: str, keep: int):
+    """Delete all but the newest `keep` runs (0 keeps everything); a run is every file sharing one prefix"""
+    if keep <= 0:
+        return
+    runs = {}
+    for path in glob.glob(os.path.join(directory, '*')):
+        runs.setdefault(os.path.basename(path).split('.', 1)[0], []).append(path)
+    for prefix in sorted(runs)[:max(0, len(runs) - keep)]:
+        for path in runs[prefix]:
+            try:
+                os.remove(path)
+            except OSError as e:
+                logging.warning(f"Could not remove old profile {path}: {e}")
+
+
+def _function_label(func) -> str:
+    filename, line, name = func
+    # Angle brackets (<listcomp>, <module>) would be swallowed by the HTML log console
+    return f"{os.path.basename(filename)}:{line}({name.strip('<>')})"
+
+
+@contextmanager
+def profile_run(name: str, emit: Optional[Callable] = None, enabled: Optional[bool] = None):
+    """
+    Profile the with-block when enabled (see profiling_enabled).
+
+    Writes <timestamp>-<name>.prof (cProfile stats, load with pstats or snakeviz)
+    and <timestamp>-<name>.txt (top functions and allocations) into PROFILE_DIR,
+    then emits a short summary as log events. cProfile only sees the calling
+    thread; tracemalloc covers allocations from every thread.
+    """
+    if not profiling_enabled(enabled):
+        yield
+        return
+
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        elapsed = time.perf_counter() - start
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if started_tracing:
+            tracemalloc.stop()
+        try:
+            _write_profile(name, profiler, snapshot, elapsed, current, peak, emit)
+        except Exception as e:
+            logging.error(f"Failed to write profile for {name}: {e}")
+
+
+def _write_profile(name, profiler, snapshot, elapsed, current, peak, emit):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    prefix = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{int(time.time() * 1000) % 1000:03d}-{name}")
+    profiler.dump_stats(f"{prefix}.prof")
+
+    stats = pstats.Stats(profiler, stream=io.StringIO())
+    stats.sort_stats('cumulative')
+    functions = [
+        (func, entry[3], entry[1])  # cumulative seconds, primitive call count
+        for func, entry in sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    ][:TOP_FUNCTIONS]
+    snapshot = snapshot.filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+    ])
+    allocations = snapshot.statistics('lineno')[:TOP_ALLOCATIONS]
+
+    report = io.StringIO()
+    report.write(f"{name}: {elapsed:.3f}s wall, peak traced memory {peak / 1024:.0f} KiB, "
+                 f"{current / 1024:.0f} KiB still allocated\n\nTop functions by cumulative time:\n")
+    stats.stream = report
+    stats.print_stats(TOP_FUNCTIONS)
+    report.write("Top allocations by line:\n")
+    for stat in allocations:
+        report.write(f"  {stat}\n")
+    with open(f"{prefix}.txt", 'w') as f:
+        f.write(report.getvalue())
+    _rotate(PROFILE_DIR, PROFILE_KEEP)
+
+    lines = [f"Profile saved to {prefix}.prof ({elapsed:.2f}s, peak memory {peak / 1024:.0f} KiB)"]
+    lines += [f"  cpu {seconds:.3f}s x{calls} {_function_label(func)}" for func, seconds, calls in functions[:SUMMARY_LINES]]
+    lines += [
+        f"  mem {stat.size / 1024:.0f} KiB in {stat.count} block(s) at "
+        f"{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}"
+        for stat in allocations[:SUMMARY_LINES]
+    ]
+    for line in lines:
+        if emit:
+            emit({'type': 'log', 'level': 'info', 'message': line})
+        else:
+            logging.info(line)
@@ -0,0 +1,189 @@
+"""
+Single-flight coordination of scraper runs with fan-out of their events to every listener
+"""
+import itertools
+import logging
+import secrets
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+REPLAY_EVENTS = 1000  # Events of a run kept for late and reconnecting listeners
+RECENT_RUNS = 20      # Finished runs kept so reconnecting listeners can still catch up
+
+# Differs in every process, so event ids handed out before a restart never resolve to a new run
+EPOCH = secrets.token_hex(4)
+
+
+class Run:
+    """
+    One run of a target. Published events are numbered 1, 2, ... and kept in
+    a bounded replay ring; listeners block in events_after() until an event
+    newer than the last one they saw arrives. The final event is {'type': 'complete'}.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, kind: str, target: Callable, kwargs: Dict, on_event: Optional[Callable] = None,
+                 replay_size: int = REPLAY_EVENTS):
+        """
+        Args:
+            kind: Run kind; at most one run of a kind is active or queued at a time
+            target: Called as target(callback=..., **kwargs) on the coordinator's worker thread
+            on_event: Called once per event before it is broadcast (side effects that must not repeat per listener)
+            replay_size: Newest events kept for listeners that attach late or reconnect
+        """
+        self.id = next(self._ids)
+        self.kind = kind
+        self.target = target
+        self.kwargs = kwargs
+        self.on_event = on_event
+        self.state = QUEUED
+        self.last_id = 0  # Number of the newest event
+        self.events = deque(maxlen=replay_size)  # (number, event) pairs, contiguous numbers
+        self._cond = threading.Condition()
+        self._listeners = []  # Called after every event, e.g. to wake an asyncio stream
+        self._done = threading.Event()
+
+    def publish(self, event: Dict):
+        if self.on_event:
+            try:
+                self.on_event(event)
+            except Exception as e:
+                logging.error(f"Error handling {self.kind} run event: {e}")
+        with self._cond:
+            self.last_id += 1
+            self.events.append((self.last_id, event))
+            self._cond.notify_all()
+            listeners = list(self._listeners)
+        self._notify(listeners)
+
+    def _notify(self, listeners):
+        for listener in listeners:
+            try:
+                listener()
+            except Exception as e:
+                logging.debug(f"Dropping failed {self.kind} run listener: {e}")
+                self.remove_listener(listener)
+
+    def add_listener(self, listener: Callable):
+        """Call listener() (from the publishing thread) whenever an event is published"""
+        with self._cond:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable):
+        with self._cond:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def events_after(self, last_seen: int, timeout: Optional[float] = None) -> Tuple[List[Tuple[int, Dict]], int]:
+        """
+        Events numbered above last_seen, waiting up to timeout for one if there are none yet.
+        Returns (events, missed) where missed counts newer events already dropped from the ring.
+        """
+        with self._cond:
+            if self.last_id <= last_seen and self.state != DONE and timeout != 0:
+                self._cond.wait(timeout)
+            oldest = self.events[0][0] if self.events else self.last_id + 1
+            missed = max(0, oldest - last_seen - 1)
+            start = max(0, last_seen + 1 - oldest)
+            return list(itertools.islice(self.events, start, None)), missed
+
+    def exhausted(self, last_seen: int) -> bool:
+        """True once the run is over and has no event numbered above last_seen"""
+        with self._cond:
+            return self.state == DONE and self.last_id <= last_seen
+
+    def event_id(self, number: int) -> str:
+        """SSE id of the run's event number, see sse.parse_event_id"""
+        return f"{EPOCH}:{self.id}:{number}"
+
+    def finish(self):
+        self.publish({'type': 'complete'})
+        with self._cond:
+            self.state = DONE
+            self._cond.notify_all()
+        self._done.set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+
+class RunCoordinator:
+    """
+    Runs one target at a time. Asking for a kind that is already running or
+    queued returns that run to attach to instead of starting another; other
+    kinds are queued (one per kind) and started in order once the active run
+    finishes, since every run reads and writes the same history files.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Optional[Run] = None
+        self._queued: Dict[str, Run] = {}  # Insertion ordered: started first come, first served
+        self._recent: Dict[int, Run] = OrderedDict()  # Run id -> run, newest last
+
+    def submit(self, kind: str, target: Callable, kwargs: Optional[Dict] = None,
+               on_event: Optional[Callable] = None) -> Tuple[Run, bool]:
+        """Start or queue a run of kind; returns (run, attached) where attached means it already existed"""
+        with self._lock:
+            if self._active is not None and self._active.kind == kind:
+                return self._active, True
+            if kind in self._queued:
+                return self._queued[kind], True
+            run = Run(kind, target, kwargs or {}, on_event)
+            self._recent[run.id] = run
+            while len(self._recent) > RECENT_RUNS:
+                self._recent.popitem(last=False)
+            if self._active is None:
+                self._start(run)
+            else:
+                self._queued[kind] = run
+                run.publish({'type': 'log', 'level': 'info',
+                             'message': f"Queued until the running {self._active.kind} run finishes..."})
+            return run, False
+
+    def run(self, kind: str, target: Callable, kwargs: Optional[Dict] = None,
+            callback: Optional[Callable] = None, on_event: Optional[Callable] = None) -> Run:
+        """Submit (or attach to) a run and block until it ends, passing its events to callback"""
+        run, _ = self.submit(kind, target, kwargs, on_event)
+        last_seen = 0
+        while True:
+            events, _ = run.events_after(last_seen)
+            for last_seen, event in events:
+                if event.get('type') == 'complete':
+                    return run
+                if callback:
+                    callback(event)
+
+    def active(self) -> Optional[Run]:
+        with self._lock:
+            return self._active
+
+    def get(self, run_id: int) -> Optional[Run]:
+        """A queued, running or recently finished run by id"""
+        with self._lock:
+            return self._recent.get(run_id)
+
+    def _start(self, run: Run):
+        # Called with self._lock held
+        self._active = run
+        run.state = RUNNING
+        threading.Thread(target=self._execute, args=(run,), name=f"{run.kind}-run-{run.id}", daemon=True).start()
+
+    def _execute(self, run: Run):
+        try:
+            run.target(callback=run.publish, **run.kwargs)
+        except Exception as e:
+            logging.error(f"{run.kind} run failed: {e}")
+            run.publish({'type': 'log', 'level': 'error', 'message': f"FAILED: {e}"})
+        finally:
+            run.finish()
+            with self._lock:
+                self._active = None
+                if self._queued:
+                    kind = next(iter(self._queued))
+                    self._start(self._queued.pop(kind))
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+In-process scheduler: runs the notifier on the configured schedule and polls
+often around promotion rotations instead of relying on an external cron
+"""
+import datetime
+import logging
+import random
+import threading
+import time
+from collections import namedtuple
+from typing import Callable, Iterable, List, Optional
+
+from check_free_games import (cached_free_games, emit_metric, get_settings as current_settings, run_process,
+                              start_outbox_drainer)
+from game import Game
+
+FREQUENCIES = {'hourly': 3600, '6hours': 6 * 3600, '12hours': 12 * 3600, 'daily': 86400}
+DEFAULT_PREFERRED_TIME = (9, 0)
+ROTATION_DELAY = 60           # Seconds after a promotion ends before the first poll, so the feed has updated
+SETTINGS_CHECK_INTERVAL = 60  # Longest sleep before checking whether settings changed
+
+# A planned run: epoch and why ('schedule' or 'rotation')
+WakeUp = namedtuple('WakeUp', ['at', 'reason'])
+
+
+def parse_preferred_time(value: str):
+    """(hour, minute) from "HH:MM", falling back to 09:00"""
+    try:
+        hour, minute = (int(part) for part in str(value).split(':', 1))
+        if 0 <= hour < 24 and 0 <= minute < 60:
+            return hour, minute
+    except ValueError:
+        pass
+    logging.warning(f"Invalid preferred time {value!r}, using 09:00")
+    return DEFAULT_PREFERRED_TIME
+
+
+def next_scheduled_run(now: float, frequency: str, preferred_time: str) -> Optional[float]:
+    """
+    Next slot of the regular schedule after now, or None for manual.
+    Slots are preferred_time (local time) plus whole intervals within each day.
+    """
+    interval = FREQUENCIES.get(frequency)
+    if not interval:
+        return None
+    hour, minute = parse_preferred_time(preferred_time)
+    today = datetime.date.fromtimestamp(now)
+    slots = []
+    for offset in (-1, 0, 1):
+        # Anchored per calendar day so daily runs stay at the same wall-clock time across DST changes
+        anchor = datetime.datetime.combine(today + datetime.timedelta(days=offset), datetime.time(hour, minute))
+        slots.extend(anchor.timestamp() + k * interval for k in range(86400 // interval))
+    return min(slot for slot in slots if slot > now)
+
+
+def rotation_times(games: Iterable) -> List[float]:
+    """Sorted epochs at which the known promotions end, i.e. when new giveaways are expected"""
+    return sorted({game.end_ts for game in games if game.end_ts is not None})
+
+
+def plan_next_run(now: float, settings, rotations: Iterable[float], rng=random,
+                  after: Optional[float] = None, jitter: Optional[Callable[[float, float], float]] = None) -> Optional[WakeUp]:
+    """
+    Earliest of the first regular slot after `after` (the last run; defaults
+    to now) plus up to schedule_jitter seconds, and the next rotation poll. A
+    slot between after and now has not run yet, so it is due at once. Within
+    rotation_poll_window after a promotion ends, polls repeat every
+    rotation_poll_interval after the last run until the feed shows new games.
+    jitter(base, upper) gives the random delay of the wake-up planned at base
+    (default rng.uniform(0, upper)). Returns None when the frequency is manual.
+    """
+    after = now if after is None else after
+    jitter = jitter or (lambda base, upper: rng.uniform(0, upper))
+    scheduled = next_scheduled_run(after, settings.check_frequency, settings.preferred_time)
+    if scheduled is None:
+        return None
+    candidates = [WakeUp(scheduled + jitter(scheduled, settings.schedule_jitter), 'schedule')]
+
+    interval = settings.rotation_poll_interval
+    rotation_jitter = min(settings.schedule_jitter, interval / 5)
+    for rotation in rotations:
+        if rotation + settings.rotation_poll_window < now:
+            continue  # Window over; the regular schedule takes it from here
+        base = max(after, rotation) + interval if rotation <= now else rotation + ROTATION_DELAY
+        candidates.append(WakeUp(base + jitter(base, rotation_jitter), 'rotation'))
+        break
+    return min(candidates)
+
+
+class Scheduler:
+    """Runs run_process at planned wake-ups until stopped; settings are re-read while sleeping"""
+
+    def __init__(self, run: Optional[Callable] = None, get_settings: Optional[Callable] = None,
+                 clock: Callable[[], float] = time.time, rng=None):
+        """
+        Args:
+            run: run_process-compatible callable (callback=, settings=); defaults to run_process
+            get_settings: Returns the current settings snapshot; defaults to the settings.json one
+            clock: Epoch source, replaceable for testing
+            rng: random.Random used for jitter
+        """
+        self.run = run or run_process
+        self.get_settings = get_settings or current_settings
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.known_games = []  # Free games seen by the latest run, source of the rotation times
+        self.last_run = None   # Start of the latest run; slots after it are still owed a run
+        self._jitters = {}     # Planned base epoch -> jitter, so re-planning keeps the same wake-up
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self, reason: str, settings):
+        found = []
+
+        def callback(event):
+            if event.get('type') == 'found':
+                found.append(Game.from_dict(event['game']))
+
+        if reason == 'rotation':
+            # Revalidate the promotions feed on every rotation poll instead of serving it from cache
+            settings = settings._replace(free_games_cache_ttl=0)
+        logging.info(f"Scheduler: starting {reason} run")
+        self.last_run = self.clock()
+        self._jitters.clear()
+        emit_metric(None, 'notifier_scheduler_runs_total', 1, kind='counter',
+                    help_text="Runs started by the scheduler", reason=reason)
+        try:
+            self.run(callback=callback, settings=settings)
+        except Exception as e:
+            logging.error(f"Scheduler: {reason} run failed: {e}")
+        if found:
+            self.known_games = found
+
+    def _jitter(self, base: float, upper: float) -> float:
+        """Jitter of the wake-up planned at base, drawn once however often the plan is redone"""
+        if base not in self._jitters:
+            self._jitters[base] = self.rng.uniform(0, upper)
+        return min(self._jitters[base], upper)
+
+    def _sleep_until(self, wakeup: Optional[WakeUp], settings) -> bool:
+        """Wait for the wake-up; False if stopped or settings changed first (the plan is then redone)"""
+        while True:
+            remaining = (wakeup.at if wakeup else float('inf')) - self.clock()
+            if remaining <= 0:
+                return True
+            if self._stop.wait(min(remaining, SETTINGS_CHECK_INTERVAL)):
+                return False
+            if self.get_settings() is not settings:
+                logging.info("Scheduler: settings changed, re-planning")
+                return False
+
+    def run_forever(self):
+        """Block, running the notifier at each planned wake-up until stop() is called"""
+        settings = self.get_settings()
+        self.last_run = self.clock()  # Slots before start-up are not owed a run
+        self.known_games = cached_free_games(settings)
+        if settings.check_frequency in FREQUENCIES and not self.known_games:
+            # Nothing cached yet, so there are no promotion dates to plan around
+            self._run('startup', settings)
+
+        while not self._stop.is_set():
+            settings = self.get_settings()
+            wakeup = plan_next_run(self.clock(), settings, rotation_times(self.known_games), self.rng,
+                                   after=self.last_run, jitter=self._jitter)
+            if wakeup is None:
+                logging.info(f"Scheduler: check frequency is {settings.check_frequency!r}, nothing scheduled")
+            else:
+                logging.info(f"Scheduler: next {wakeup.reason} run at "
+                             f"{datetime.datetime.fromtimestamp(wakeup.at):%Y-%m-%d %H:%M:%S}")
+            if self._sleep_until(wakeup, settings):
+                self._run(wakeup.reason, settings)
+
+    def start(self) -> threading.Thread:
+        """Run the scheduler in a daemon thread"""
+        self._thread = threading.Thread(target=self.run_forever, name='scheduler', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    """CLI entry point: python scheduler.py"""
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    start_outbox_drainer()
+    scheduler = Scheduler()
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        scheduler.stop()
+
+
+if __name__ == "__main__":
+    main()
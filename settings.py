@@ -0,0 +1,219 @@
+"""
+Immutable settings snapshots cached per settings file and invalidated by mtime or writes
+"""
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+from typing import Dict, Optional
+
+from filters import FilterEngine, DEFAULT_EXCLUDE_KEYWORDS
+
+SETTINGS_FILE = 'settings.json'
+
+# One consistent view of settings.json; a run keeps its snapshot even if the file changes meanwhile
+Settings = namedtuple('Settings', [
+    'price_threshold',                 # Minor units (settings.json stores major units); 0 with deep_search_free
+    'currency',
+    'emails',
+    'categories',
+    'deep_search_free',
+    'exclude_keywords',
+    'filters',                         # FilterEngine compiled once per snapshot
+    'url_validation_workers',
+    'url_validation_budget',
+    'url_cache_ttl_valid',             # Seconds
+    'url_cache_ttl_invalid',           # Seconds
+    'url_cache_max_entries',
+    'catalog_page_size',
+    'catalog_max_items',
+    'catalog_incremental',             # Only evaluate catalog offers that changed since the last scan
+    'free_games_cache_ttl',
+    'smtp_workers',
+    'smtp_rate_limit',
+    'history_undated_retention_days',
+    'history_max_entries',
+    'price_history_retention_days',    # Age after which price points are compacted away
+    'outbox_max_attempts',
+    'outbox_retry_backoff',
+    'countries',
+    'check_frequency',                 # manual, hourly, 6hours, 12hours or daily (scheduler daemon)
+    'preferred_time',                  # "HH:MM" local time the schedule is anchored to
+    'schedule_jitter',                 # Seconds of random delay added to scheduled runs
+    'rotation_poll_interval',          # Seconds between polls around a promotion rotation
+    'rotation_poll_window',            # Seconds after a promotion ends during which polling stays frequent
+    'http',                            # Keyword arguments for http_session.configure
+    'raw',                             # Read-only view of the file contents
+])
+
+
+def parse_countries(value) -> tuple:
+    """Two-letter region codes from a list or a comma separated string, defaulting to ('IN',)"""
+    if isinstance(value, str):
+        value = value.split(',')
+    countries = []
+    for code in value or []:
+        code = str(code).strip().upper()
+        if len(code) == 2 and code.isalpha():
+            if code not in countries:
+                countries.append(code)
+        elif code:
+            logging.warning(f"Ignoring invalid country code {code!r}")
+    return tuple(countries) or ('IN',)
+
+
+def _field(data: Dict, key: str, default, convert=lambda value: value, minimum=None):
+    """
+    convert(data[key]) clamped to minimum, or convert(default) when the key is
+    missing or its value cannot be converted (e.g. null posted by the dashboard)
+    """
+    value = data.get(key, default)
+    try:
+        value = convert(value)
+    except (TypeError, ValueError):
+        logging.warning(f"Invalid setting {key}={value!r}, using {default!r}")
+        value = convert(default)
+    return value if minimum is None else max(minimum, value)
+
+
+def parse_settings(data: Dict) -> Settings:
+    """
+    Build a snapshot from settings.json contents, applying defaults and bounds.
+    A field that does not parse falls back to its default on its own.
+    """
+    if not isinstance(data, dict):
+        raise ValueError(f"Settings must be a JSON object, got {type(data).__name__}")
+    deep_search_free = bool(data.get('deep_search_free', False))
+    categories = _field(data, 'categories', [], tuple)
+    exclude_keywords = _field(data, 'exclude_keywords', DEFAULT_EXCLUDE_KEYWORDS, tuple)
+    return Settings(
+        # If deep search is enabled, enforce price = 0
+        price_threshold=0 if deep_search_free else _field(data, 'price_threshold', 100, int) * 100,
+        currency=data.get('currency') or 'INR',
+        emails=_field(data, 'emails', [], tuple),
+        categories=categories,
+        deep_search_free=deep_search_free,
+        exclude_keywords=exclude_keywords,
+        filters=FilterEngine(list(exclude_keywords), list(categories)),
+        url_validation_workers=_field(data, 'url_validation_workers', 8, int, minimum=1),
+        url_validation_budget=_field(data, 'url_validation_budget', 60, float),
+        url_cache_ttl_valid=_field(data, 'url_cache_ttl_valid_hours', 168, float) * 3600,
+        url_cache_ttl_invalid=_field(data, 'url_cache_ttl_invalid_hours', 24, float) * 3600,
+        url_cache_max_entries=_field(data, 'url_cache_max_entries', 5000, int),
+        catalog_page_size=_field(data, 'catalog_page_size', 100, int, minimum=1),
+        catalog_max_items=_field(data, 'catalog_max_items', 1000, int, minimum=1),
+        catalog_incremental=bool(data.get('catalog_incremental', True)),
+        free_games_cache_ttl=_field(data, 'free_games_cache_ttl', 300, float),
+        smtp_workers=_field(data, 'smtp_workers', 4, int, minimum=1),
+        smtp_rate_limit=_field(data, 'smtp_rate_limit', 0, float),
+        history_undated_retention_days=_field(data, 'history_undated_retention_days', 30, float),
+        history_max_entries=_field(data, 'history_max_entries', 5000, int, minimum=1),
+        price_history_retention_days=_field(data, 'price_history_retention_days', 365, float, minimum=1.0),
+        outbox_max_attempts=_field(data, 'outbox_max_attempts', 5, int, minimum=1),
+        outbox_retry_backoff=_field(data, 'outbox_retry_backoff', 60, float),
+        countries=parse_countries(data.get('countries', ['IN'])),
+        # The dashboard saves these to settings.json; .env provides the defaults
+        check_frequency=data.get('check_frequency') or os.getenv('CHECK_FREQUENCY', 'manual'),
+        preferred_time=data.get('preferred_time') or os.getenv('PREFERRED_TIME', '09:00'),
+        schedule_jitter=_field(data, 'schedule_jitter', 600, float, minimum=0.0),
+        rotation_poll_interval=_field(data, 'rotation_poll_interval', 300, float, minimum=60.0),
+        rotation_poll_window=_field(data, 'rotation_poll_window', 3600, float, minimum=0.0),
+        http=MappingProxyType({
+            'pool_size': data.get('http_pool_size'),
+            'connect_timeout': data.get('http_connect_timeout'),
+            'read_timeout': data.get('http_read_timeout'),
+            'max_retries': data.get('http_max_retries'),
+            'backoff_factor': data.get('http_backoff_factor'),
+            'keep_alive': data.get('http_keep_alive'),
+        }),
+        raw=MappingProxyType(dict(data)),
+    )
+
+
+class SettingsStore:
+    """
+    Caches the parsed snapshot of one settings file; a stat per get() detects
+    outside edits. The raw file contents are kept apart from the snapshot, so
+    read-modify-write callers always see every key on disk.
+    """
+
+    def __init__(self, path: str = SETTINGS_FILE):
+        self.path = path
+        self._raw: Dict = {}  # Last JSON object read from (or written to) the file
+        self._snapshot: Optional[Settings] = None
+        self._signature = None  # (mtime_ns, size) the snapshot was parsed from
+        self._lock = threading.Lock()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def get(self) -> Settings:
+        """Current snapshot, re-read only if the file changed since it was parsed"""
+        signature = self._stat()
+        with self._lock:
+            if self._snapshot is not None and signature == self._signature:
+                return self._snapshot
+            try:
+                data = {}
+                if signature is not None:
+                    with open(self.path, 'r') as f:
+                        data = json.load(f)
+                if not isinstance(data, dict):
+                    raise ValueError(f"{self.path} does not hold a JSON object")
+                self._raw = data
+                snapshot = parse_settings(data)
+            except Exception as e:
+                logging.error(f"Failed to load settings: {e}")
+                # Keep serving the last good snapshot rather than defaults
+                snapshot = self._snapshot or parse_settings({})
+            else:
+                logging.info(f"Loaded settings: Threshold={snapshot.price_threshold}, "
+                             f"Emails={len(snapshot.emails)}, DeepSearch={snapshot.deep_search_free}")
+            self._snapshot = snapshot
+            self._signature = signature
+            return snapshot
+
+    def raw(self) -> Dict:
+        """The file's JSON object as last read, even if some fields did not parse"""
+        self.get()
+        with self._lock:
+            return self._raw
+
+    def write(self, data: Dict) -> Settings:
+        """Atomically replace the file and the cached snapshot; data is validated before the file is touched"""
+        snapshot = parse_settings(data)
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self._raw = dict(data)
+            self._snapshot = snapshot
+            self._signature = self._stat()
+            return self._snapshot
+
+    def invalidate(self):
+        """Force the next get() to re-read the file"""
+        with self._lock:
+            self._snapshot = None
+            self._signature = None
+
+
+_stores: Dict[str, SettingsStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_settings_store(path: str = SETTINGS_FILE) -> SettingsStore:
+    """Shared store for a settings file, keyed by absolute path"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SettingsStore(key)
+        return store
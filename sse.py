@@ -0,0 +1,98 @@
+"""
+Server-sent event streams of scraper runs with event ids, heartbeats and Last-Event-ID resume
+"""
+import asyncio
+import json
+from typing import Dict, Iterator, Optional, Tuple
+
+HEARTBEAT_INTERVAL = 15  # Seconds of silence before a comment line keeps proxies from closing the stream
+RETRY_MS = 2000          # Reconnect delay suggested to EventSource clients
+
+# Sent with every stream so buffering proxies (e.g. nginx) pass events through immediately
+STREAM_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def format_event(data: Dict, event_id: Optional[str] = None) -> str:
+    """
+    One SSE message; events with an id move the client's Last-Event-ID forward.
+    Records in events (e.g. the Game of a 'found' event) are sent as their to_dict().
+    """
+    prefix = f"id: {event_id}\n" if event_id else ""
+    return f"{prefix}data: {json.dumps(data, default=lambda value: value.to_dict())}\n\n"
+
+
+# Sent instead of a run's events when a reconnect asks for a run this process does not know (any more)
+RUN_UNAVAILABLE = [{'type': 'log', 'level': 'warning', 'message': "The run's output is no longer available."},
+                   {'type': 'complete'}]
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int, int]]:
+    """(epoch, run id, event number) from an "<epoch>:<run>:<event>" id, or None if missing or malformed"""
+    try:
+        epoch, run_id, number = (value or '').split(':')
+        return epoch, int(run_id), int(number)
+    except ValueError:
+        return None
+
+
+def run_event_stream(run, last_seen: int = 0, heartbeat: float = HEARTBEAT_INTERVAL) -> Iterator[str]:
+    """
+    SSE messages for a run's events after last_seen, ending with its 'complete'
+    event. Blocks until the run publishes, sending a heartbeat comment after
+    heartbeat seconds of silence. A last_seen beyond the end of a finished run
+    ends the stream at once.
+    """
+    yield f"retry: {RETRY_MS}\n\n"
+    while True:
+        events, missed = run.events_after(last_seen, timeout=heartbeat)
+        if missed:
+            yield format_event({'type': 'log', 'level': 'warning',
+                                'message': f"{missed} earlier message(s) of this run are no longer available."})
+        if not events:
+            if run.exhausted(last_seen):
+                yield from (format_event(event) for event in RUN_UNAVAILABLE)
+                return
+            yield ": heartbeat\n\n"
+            continue
+        for last_seen, event in events:
+            yield format_event(event, run.event_id(last_seen))
+            if event.get('type') == 'complete':
+                return
+
+
+async def async_run_event_stream(run, last_seen: int = 0, heartbeat: float = HEARTBEAT_INTERVAL):
+    """
+    run_event_stream as an async generator: waiting for events costs no thread,
+    since the run wakes the event loop through a listener when it publishes.
+    """
+    loop = asyncio.get_running_loop()
+    published = asyncio.Event()
+
+    def wake():
+        loop.call_soon_threadsafe(published.set)
+
+    run.add_listener(wake)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            published.clear()
+            events, missed = run.events_after(last_seen, timeout=0)
+            if missed:
+                yield format_event({'type': 'log', 'level': 'warning',
+                                    'message': f"{missed} earlier message(s) of this run are no longer available."})
+            if not events:
+                if run.exhausted(last_seen):
+                    for event in RUN_UNAVAILABLE:
+                        yield format_event(event)
+                    return
+                try:
+                    await asyncio.wait_for(published.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                continue
+            for last_seen, event in events:
+                yield format_event(event, run.event_id(last_seen))
+                if event.get('type') == 'complete':
+                    return
+    finally:
+        run.remove_listener(wake)
@@ -0,0 +1,96 @@
+"""
+Persistent cache of store URL validation results, keyed by product slug
+"""
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+VALID_STATUSES = (200, 301, 302)
+
+
+class UrlValidationCache:
+    """On-disk cache of HTTP status per slug with separate TTLs for good and bad results"""
+
+    def __init__(self, path='url_validation_cache.json', ttl_valid=7 * 86400,
+                 ttl_invalid=86400, max_entries=5000):
+        """
+        Args:
+            path: JSON file holding {slug: {"status": int, "checked_at": epoch}}
+            ttl_valid: Seconds a reachable URL stays fresh
+            ttl_invalid: Seconds an unreachable URL stays fresh (negative caching)
+            max_entries: Oldest entries are evicted beyond this size
+        """
+        self.path = path
+        self.ttl_valid = ttl_valid
+        self.ttl_invalid = ttl_invalid
+        self.max_entries = max_entries
+        self.entries: Dict[str, Dict] = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = False
+        self._lock = threading.Lock()
+        self.load()
+
+    @staticmethod
+    def slug_for(url: str) -> str:
+        """Cache key for a store URL (the product slug)"""
+        return url.rstrip('/').rsplit('/', 1)[-1]
+
+    def load(self):
+        """Load cache entries from disk"""
+        try:
+            if os.path.exists(self.path):
+                with open(self.path, 'r') as f:
+                    self.entries = json.load(f)
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable URL cache {self.path}: {e}")
+            self.entries = {}
+
+    def get(self, url: str, now: Optional[float] = None) -> Optional[bool]:
+        """Return cached validity for url, or None if missing or stale"""
+        now = now if now is not None else time.time()
+        with self._lock:
+            entry = self.entries.get(self.slug_for(url))
+            if entry:
+                is_valid = entry.get('status') in VALID_STATUSES
+                ttl = self.ttl_valid if is_valid else self.ttl_invalid
+                if now - entry.get('checked_at', 0) < ttl:
+                    self.hits += 1
+                    return is_valid
+            self.misses += 1
+            return None
+
+    def put(self, url: str, status: int, now: Optional[float] = None):
+        """Record the HTTP status observed for url"""
+        with self._lock:
+            self.entries[self.slug_for(url)] = {
+                'status': status,
+                'checked_at': now if now is not None else time.time(),
+            }
+            self._dirty = True
+
+    def _evict(self):
+        """Drop the oldest entries once the size cap is exceeded"""
+        overflow = len(self.entries) - self.max_entries
+        if overflow > 0:
+            oldest = sorted(self.entries, key=lambda slug: self.entries[slug].get('checked_at', 0))
+            for slug in oldest[:overflow]:
+                del self.entries[slug]
+
+    def save(self):
+        """Write the cache atomically if it changed"""
+        with self._lock:
+            if not self._dirty:
+                return
+            self._evict()
+            try:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp_path, self.path)
+                self._dirty = False
+            except Exception as e:
+                logging.error(f"Failed to save URL cache: {e}")
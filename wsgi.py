@@ -17,4 +17,9 @@ dotenv_path = os.path.join(project_home, '.env')
 load_dotenv(dotenv_path)
 
 # Import your Flask app
-from app import app as application
+from app import app as application, start_outbox_drainer, start_scheduler
+
+# Send the emails that dashboard runs queue (see README, "Email delivery")
+start_outbox_drainer()
+# Runs the built-in scheduler when SCHEDULER_ENABLED=true (see README, "Built-in Scheduler")
+start_scheduler()